@@ -0,0 +1,574 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC Column-level counterparts of the `DateGetter` calendar methods.
+# MAGIC
+# MAGIC `SparkDateColumns` builds native Spark `Column` expressions and `PandasDateColumns` works on whole pandas Series,
+# MAGIC so the logic can be applied to large tables without Python UDFs or row-by-row `.apply`.
+# MAGIC Both operate on dates: timestamps are truncated to the date before the transform.
+
+# COMMAND ----------
+
+# MAGIC %run ./dates_handle_lib
+
+# COMMAND ----------
+
+import re
+import pandas as pd
+import pyspark.sql.functions as F
+from pyspark.sql import Column
+from typing import Union
+
+
+# COMMAND ----------
+
+class SparkDateColumns:
+    """
+    A class with Spark Column expressions matching the DateGetter calendar methods.
+    Every method takes a column name or a Column and returns a Column, nothing leaves the JVM.
+
+    Attributes:
+    -----------
+     - d_spark_patterns: dict
+         Mapping of the supported strftime tokens to Spark datetime patterns
+
+    Methods:
+    --------
+    - month_start_date(column: Union[str, Column]) -> Column:
+        start date of the month
+
+    - month_end_date(column: Union[str, Column]) -> Column:
+        end date of the month
+
+    - week_start_date(column: Union[str, Column]) -> Column:
+        start date (Monday) of the week
+
+    - week_end_date(column: Union[str, Column]) -> Column:
+        end date (Sunday) of the week
+
+    - quarter_start_date(column: Union[str, Column]) -> Column:
+        start date of the quarter
+
+    - quarter_end_date(column: Union[str, Column]) -> Column:
+        end date of the quarter
+
+    - fy_start_date(column: Union[str, Column], fy_month: int = 7) -> Column:
+        start date of the Fiscal Year
+
+    - fy_end_date(column: Union[str, Column], fy_month: int = 7) -> Column:
+        end date of the Fiscal Year
+
+    - calculate_quarter_num(column: Union[str, Column]) -> Column:
+        quarter number
+
+    - get_string_quarter(column: Union[str, Column]) -> Column:
+        string representation of the quarter
+
+    - date_format_to_string(column: Union[str, Column], date_format: str) -> Column:
+        formats the column with a strftime format, including the custom %QAR and %QNUM tokens
+    """
+
+    d_spark_patterns = {
+        "%Y": "yyyy",
+        "%y": "yy",
+        "%m": "MM",
+        "%d": "dd",
+        "%j": "DDD",
+        "%H": "HH",
+        "%I": "hh",
+        "%M": "mm",
+        "%S": "ss",
+        "%f": "SSSSSS",
+        "%p": "a",
+        "%b": "MMM",
+        "%B": "MMMM",
+        "%a": "E",
+        "%A": "EEEE",
+    }
+
+    @staticmethod
+    def _to_date(column: Union[str, Column]) -> Column:
+        return F.to_date(F.col(column) if isinstance(column, str) else column)
+
+    @staticmethod
+    def month_start_date(column: Union[str, Column]) -> Column:
+        """
+        Returns the start date of the month, same as DateGetter.month_start_date.
+
+        Parameters:
+        ----------
+         - column: Union[str, Column]
+             Column name or Column of date or timestamp type
+
+        Returns:
+        -------
+        Column
+        """
+        return F.trunc(SparkDateColumns._to_date(column), "month")
+
+    @staticmethod
+    def month_end_date(column: Union[str, Column]) -> Column:
+        """
+        Returns the end date of the month, same as DateGetter.month_end_date.
+
+        Parameters:
+        ----------
+         - column: Union[str, Column]
+             Column name or Column of date or timestamp type
+
+        Returns:
+        -------
+        Column
+        """
+        return F.last_day(SparkDateColumns._to_date(column))
+
+    @staticmethod
+    def week_start_date(column: Union[str, Column]) -> Column:
+        """
+        Returns the start date (Monday) of the week, same as DateGetter.week_start_date.
+
+        Parameters:
+        ----------
+         - column: Union[str, Column]
+             Column name or Column of date or timestamp type
+
+        Returns:
+        -------
+        Column
+        """
+        return F.trunc(SparkDateColumns._to_date(column), "week")
+
+    @staticmethod
+    def week_end_date(column: Union[str, Column]) -> Column:
+        """
+        Returns the end date (Sunday) of the week, same as DateGetter.week_end_date.
+
+        Parameters:
+        ----------
+         - column: Union[str, Column]
+             Column name or Column of date or timestamp type
+
+        Returns:
+        -------
+        Column
+        """
+        return F.date_add(SparkDateColumns.week_start_date(column), 6)
+
+    @staticmethod
+    def quarter_start_date(column: Union[str, Column]) -> Column:
+        """
+        Returns the start date of the quarter, same as DateGetter.quarter_start_date.
+
+        Parameters:
+        ----------
+         - column: Union[str, Column]
+             Column name or Column of date or timestamp type
+
+        Returns:
+        -------
+        Column
+        """
+        return F.trunc(SparkDateColumns._to_date(column), "quarter")
+
+    @staticmethod
+    def quarter_end_date(column: Union[str, Column]) -> Column:
+        """
+        Returns the end date of the quarter, same as DateGetter.quarter_end_date.
+
+        Parameters:
+        ----------
+         - column: Union[str, Column]
+             Column name or Column of date or timestamp type
+
+        Returns:
+        -------
+        Column
+        """
+        return F.date_sub(F.add_months(SparkDateColumns.quarter_start_date(column), 3), 1)
+
+    @staticmethod
+    def fy_start_date(column: Union[str, Column], fy_month: int = 7) -> Column:
+        """
+        Returns the start date of the Fiscal Year, same as DateGetter.fy_start_date.
+        The date is shifted back to the calendar year of the FY start, truncated to the year and shifted forward again.
+
+        Parameters:
+        ----------
+         - column: Union[str, Column]
+             Column name or Column of date or timestamp type
+
+         - fy_month: int = 7
+             The first month of the Fiscal Year
+
+        Returns:
+        -------
+        Column
+        """
+        shifted = F.add_months(SparkDateColumns._to_date(column), 1 - fy_month)
+        return F.add_months(F.trunc(shifted, "year"), fy_month - 1)
+
+    @staticmethod
+    def fy_end_date(column: Union[str, Column], fy_month: int = 7) -> Column:
+        """
+        Returns the end date of the Fiscal Year, same as DateGetter.fy_end_date.
+
+        Parameters:
+        ----------
+         - column: Union[str, Column]
+             Column name or Column of date or timestamp type
+
+         - fy_month: int = 7
+             The first month of the Fiscal Year
+
+        Returns:
+        -------
+        Column
+        """
+        return F.date_sub(F.add_months(SparkDateColumns.fy_start_date(column, fy_month), 12), 1)
+
+    @staticmethod
+    def calculate_quarter_num(column: Union[str, Column]) -> Column:
+        """
+        Returns the quarter number, same as DateGetter.calculate_quarter_num.
+
+        Parameters:
+        ----------
+         - column: Union[str, Column]
+             Column name or Column of date or timestamp type
+
+        Returns:
+        -------
+        Column
+        """
+        return F.quarter(SparkDateColumns._to_date(column))
+
+    @staticmethod
+    def get_string_quarter(column: Union[str, Column]) -> Column:
+        """
+        Returns the string representation of the quarter, same as DateGetter.get_string_quarter.
+
+        Parameters:
+        ----------
+         - column: Union[str, Column]
+             Column name or Column of date or timestamp type
+
+        Returns:
+        -------
+        Column
+        """
+        quarters = F.array(*[F.lit(_) for _ in DateGetter.d_quarters.values()])
+        return F.element_at(quarters, SparkDateColumns.calculate_quarter_num(column))
+
+    @staticmethod
+    def date_format_to_string(column: Union[str, Column], date_format: str) -> Column:
+        """
+        Formats the column with a strftime format, same as DateGetter.date_format_to_string.
+        The format is translated once to Spark datetime patterns, %QAR and %QNUM become quarter expressions.
+
+        Parameters:
+        ----------
+         - column: Union[str, Column]
+             Column name or Column of date or timestamp type
+
+         - date_format: str
+             The strftime format of the date string to be returned
+
+        Returns:
+        -------
+        Column
+        """
+        if not date_format:
+            raise ValueError("Empty date format, nothing to format the column with.")
+        column = F.col(column) if isinstance(column, str) else column
+        parts = []
+        pattern = ""
+        literal = ""
+
+        for token in re.findall(r"%QAR|%QNUM|%.|[^%]+", date_format):
+            if token == "%%" or not token.startswith("%"):
+                literal += "%" if token == "%%" else token
+                continue
+            if literal:
+                pattern += "'" + literal.replace("'", "''") + "'"
+                literal = ""
+            if token in ("%QAR", "%QNUM"):
+                if pattern:
+                    parts.append(F.date_format(column, pattern))
+                    pattern = ""
+                if token == "%QAR":
+                    parts.append(SparkDateColumns.get_string_quarter(column))
+                else:
+                    parts.append(SparkDateColumns.calculate_quarter_num(column).cast("string"))
+            elif token in SparkDateColumns.d_spark_patterns:
+                pattern += SparkDateColumns.d_spark_patterns[token]
+            else:
+                raise ValueError(f"Unsupported format token < {token} > for Spark columns.")
+
+        if literal:
+            pattern += "'" + literal.replace("'", "''") + "'"
+        if pattern:
+            parts.append(F.date_format(column, pattern))
+
+        return F.concat(*parts) if len(parts) > 1 else parts[0]
+
+
+# COMMAND ----------
+
+class PandasDateColumns:
+    """
+    A class with vectorized pandas operations matching the DateGetter calendar methods.
+    Every method takes a Series of dates (or strings/timestamps convertible with pd.to_datetime)
+    and returns a datetime64 Series normalized to midnight, or a number/string Series. Missing values stay missing.
+
+    Methods:
+    --------
+    - month_start_date(series: pd.Series) -> pd.Series:
+        start date of the month
+
+    - month_end_date(series: pd.Series) -> pd.Series:
+        end date of the month
+
+    - week_start_date(series: pd.Series) -> pd.Series:
+        start date (Monday) of the week
+
+    - week_end_date(series: pd.Series) -> pd.Series:
+        end date (Sunday) of the week
+
+    - quarter_start_date(series: pd.Series) -> pd.Series:
+        start date of the quarter
+
+    - quarter_end_date(series: pd.Series) -> pd.Series:
+        end date of the quarter
+
+    - fy_start_date(series: pd.Series, fy_month: int = 7) -> pd.Series:
+        start date of the Fiscal Year
+
+    - fy_end_date(series: pd.Series, fy_month: int = 7) -> pd.Series:
+        end date of the Fiscal Year
+
+    - calculate_quarter_num(series: pd.Series) -> pd.Series:
+        quarter number
+
+    - get_string_quarter(series: pd.Series) -> pd.Series:
+        string representation of the quarter
+
+    - date_format_to_string(series: pd.Series, date_format: str) -> pd.Series:
+        formats the series with a strftime format, including the custom %QAR and %QNUM tokens
+    """
+
+    @staticmethod
+    def _to_date(series: pd.Series) -> pd.Series:
+        return pd.to_datetime(series).dt.normalize()
+
+    @staticmethod
+    def month_start_date(series: pd.Series) -> pd.Series:
+        """
+        Returns the start date of the month, same as DateGetter.month_start_date.
+
+        Parameters:
+        ----------
+         - series: pd.Series
+             Series of dates, timestamps or date strings
+
+        Returns:
+        -------
+        pd.Series
+        """
+        series = PandasDateColumns._to_date(series)
+        return series - pd.to_timedelta(series.dt.day - 1, unit="D")
+
+    @staticmethod
+    def month_end_date(series: pd.Series) -> pd.Series:
+        """
+        Returns the end date of the month, same as DateGetter.month_end_date.
+
+        Parameters:
+        ----------
+         - series: pd.Series
+             Series of dates, timestamps or date strings
+
+        Returns:
+        -------
+        pd.Series
+        """
+        series = PandasDateColumns._to_date(series)
+        return series + pd.to_timedelta(series.dt.days_in_month - series.dt.day, unit="D")
+
+    @staticmethod
+    def week_start_date(series: pd.Series) -> pd.Series:
+        """
+        Returns the start date (Monday) of the week, same as DateGetter.week_start_date.
+
+        Parameters:
+        ----------
+         - series: pd.Series
+             Series of dates, timestamps or date strings
+
+        Returns:
+        -------
+        pd.Series
+        """
+        series = PandasDateColumns._to_date(series)
+        return series - pd.to_timedelta(series.dt.weekday, unit="D")
+
+    @staticmethod
+    def week_end_date(series: pd.Series) -> pd.Series:
+        """
+        Returns the end date (Sunday) of the week, same as DateGetter.week_end_date.
+
+        Parameters:
+        ----------
+         - series: pd.Series
+             Series of dates, timestamps or date strings
+
+        Returns:
+        -------
+        pd.Series
+        """
+        return PandasDateColumns.week_start_date(series) + pd.Timedelta(days=6)
+
+    @staticmethod
+    def quarter_start_date(series: pd.Series) -> pd.Series:
+        """
+        Returns the start date of the quarter, same as DateGetter.quarter_start_date.
+
+        Parameters:
+        ----------
+         - series: pd.Series
+             Series of dates, timestamps or date strings
+
+        Returns:
+        -------
+        pd.Series
+        """
+        series = PandasDateColumns._to_date(series)
+        return PandasDateColumns._make_date(series.dt.year, 3 * series.dt.quarter - 2)
+
+    @staticmethod
+    def quarter_end_date(series: pd.Series) -> pd.Series:
+        """
+        Returns the end date of the quarter, same as DateGetter.quarter_end_date.
+
+        Parameters:
+        ----------
+         - series: pd.Series
+             Series of dates, timestamps or date strings
+
+        Returns:
+        -------
+        pd.Series
+        """
+        series = PandasDateColumns._to_date(series)
+        quarter_end_month = 3 * series.dt.quarter
+        return PandasDateColumns._make_date(
+            series.dt.year + quarter_end_month // 12, quarter_end_month % 12 + 1
+        ) - pd.Timedelta(days=1)
+
+    @staticmethod
+    def fy_start_date(series: pd.Series, fy_month: int = 7) -> pd.Series:
+        """
+        Returns the start date of the Fiscal Year, same as DateGetter.fy_start_date.
+
+        Parameters:
+        ----------
+         - series: pd.Series
+             Series of dates, timestamps or date strings
+
+         - fy_month: int = 7
+             The first month of the Fiscal Year
+
+        Returns:
+        -------
+        pd.Series
+        """
+        series = PandasDateColumns._to_date(series)
+        fy_year = series.dt.year - (series.dt.month < fy_month).astype(int)
+        return PandasDateColumns._make_date(fy_year, fy_month)
+
+    @staticmethod
+    def fy_end_date(series: pd.Series, fy_month: int = 7) -> pd.Series:
+        """
+        Returns the end date of the Fiscal Year, same as DateGetter.fy_end_date.
+
+        Parameters:
+        ----------
+         - series: pd.Series
+             Series of dates, timestamps or date strings
+
+         - fy_month: int = 7
+             The first month of the Fiscal Year
+
+        Returns:
+        -------
+        pd.Series
+        """
+        series = PandasDateColumns._to_date(series)
+        fy_year = series.dt.year - (series.dt.month < fy_month).astype(int)
+        return PandasDateColumns._make_date(fy_year + 1, fy_month) - pd.Timedelta(days=1)
+
+    @staticmethod
+    def calculate_quarter_num(series: pd.Series) -> pd.Series:
+        """
+        Returns the quarter number, same as DateGetter.calculate_quarter_num.
+
+        Parameters:
+        ----------
+         - series: pd.Series
+             Series of dates, timestamps or date strings
+
+        Returns:
+        -------
+        pd.Series
+        """
+        return PandasDateColumns._to_date(series).dt.quarter
+
+    @staticmethod
+    def get_string_quarter(series: pd.Series) -> pd.Series:
+        """
+        Returns the string representation of the quarter, same as DateGetter.get_string_quarter.
+
+        Parameters:
+        ----------
+         - series: pd.Series
+             Series of dates, timestamps or date strings
+
+        Returns:
+        -------
+        pd.Series
+        """
+        return PandasDateColumns.calculate_quarter_num(series).map(DateGetter.d_quarters)
+
+    @staticmethod
+    def date_format_to_string(series: pd.Series, date_format: str) -> pd.Series:
+        """
+        Formats the series with a strftime format, same as DateGetter.date_format_to_string.
+        Rows are formatted per quarter, so %QAR and %QNUM are replaced at most four times.
+
+        Parameters:
+        ----------
+         - series: pd.Series
+             Series of dates
+
+         - date_format: str
+             The strftime format of the date strings to be returned
+
+        Returns:
+        -------
+        pd.Series
+        """
+        if not date_format:
+            raise ValueError("Empty date format, nothing to format the series with.")
+        series = pd.to_datetime(series)
+        if "%QAR" not in date_format and "%QNUM" not in date_format:
+            return series.dt.strftime(date_format)
+
+        quarters = series.dt.quarter
+        result = pd.Series(None, index=series.index, dtype=object)
+        for quarter in quarters.dropna().unique():
+            quarter = int(quarter)
+            mask = quarters == quarter
+            result[mask] = series[mask].dt.strftime(DateGetter._format_quarter_tokens(date_format, quarter))
+        return result
+
+    @staticmethod
+    def _make_date(years: pd.Series, months: Union[pd.Series, int]) -> pd.Series:
+        return pd.to_datetime(pd.DataFrame({"year": years, "month": months, "day": 1}))
@@ -1,7 +1,152 @@
 # Databricks notebook source
 from datetime import datetime, date, timedelta
 from dateutil.relativedelta import relativedelta
-from typing import  Union
+from typing import  Union, Iterator
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import re
+
+
+# COMMAND ----------
+
+class CompiledDateFormat:
+    """
+    A date format prepared once for repeated formatting and parsing.
+    The custom %QAR and %QNUM tokens are substituted in advance for every quarter, and formats built only from
+    numeric tokens (%Y, %y, %m, %d, %H, %M, %S) are parsed with a precompiled regex instead of datetime.strptime.
+    Other formats fall back to datetime.strptime. Use CompiledDateFormat.cached to share the compiled formats.
+    
+    Methods:
+    --------
+    - cached(cls, date_format: str) -> "CompiledDateFormat":
+        returns the memoized compiled format
+    
+    - format(self, date_value: datetime.date) -> str:
+        formats the date object to the string
+    
+    - parse(self, date_string: str) -> datetime:
+        converts the string to the datetime object, same as datetime.strptime
+    """
+    
+    __slots__ = ("date_format", "_quarter_formats", "_regex")
+    
+    # same patterns as datetime.strptime uses for the directives
+    d_parse_patterns = {
+        "%Y": r"(?P<Y>\d\d\d\d)",
+        "%y": r"(?P<y>\d\d)",
+        "%m": r"(?P<m>1[0-2]|0[1-9]|[1-9])",
+        "%d": r"(?P<d>3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])",
+        "%H": r"(?P<H>2[0-3]|[0-1]\d|\d)",
+        "%M": r"(?P<M>[0-5]\d|\d)",
+        "%S": r"(?P<S>6[0-1]|[0-5]\d|\d)",
+    }
+
+    def __init__(self, date_format: str) -> None:
+        """
+        Initializes the CompiledDateFormat class.
+        
+        Parameters:
+        ----------
+         - date_format: str
+             The strftime/strptime format, may contain the custom %QAR and %QNUM tokens
+            
+        Returns:
+        -------
+        None
+        """
+        self.date_format = date_format
+        self._quarter_formats = None
+        self._regex = None
+
+        if "%QAR" in date_format or "%QNUM" in date_format:
+            self._quarter_formats = {
+                quarter: DateGetter._format_quarter_tokens(date_format, quarter) for quarter in DateGetter.d_quarters
+            }
+
+        pattern = ""
+        for token in re.findall(r"%.|[^%]+", date_format):
+            if token in self.d_parse_patterns and self.d_parse_patterns[token] not in pattern:
+                pattern += self.d_parse_patterns[token]
+            elif token == "%%":
+                pattern += "%"
+            elif not token.startswith("%") and not re.search(r"\s", token):
+                pattern += re.escape(token)
+            else:
+                return
+        self._regex = re.compile(pattern, re.IGNORECASE)
+
+    @classmethod
+    @lru_cache(maxsize=256)
+    def cached(cls, date_format: str) -> "CompiledDateFormat":
+        """
+        Returns the memoized compiled format, compiled only on the first call with the format.
+        
+        Parameters:
+        ----------
+         - date_format: str
+             The strftime/strptime format
+            
+        Returns:
+        -------
+        CompiledDateFormat object
+        """
+        return cls(date_format)
+
+    def format(self, date_value: datetime.date) -> str:
+        """
+        Formats the date object to the string, same as DateGetter.date_format_to_string.
+        
+        Parameters:
+        ----------
+         - date_value: datetime.date
+             The date object to be formatted
+            
+        Returns:
+        -------
+        str
+        """
+        if self._quarter_formats is None:
+            return date_value.strftime(self.date_format)
+        return date_value.strftime(self._quarter_formats[(date_value.month - 1) // 3 + 1])
+
+    def parse(self, date_string: str) -> datetime:
+        """
+        Converts the string to the datetime object, same as datetime.strptime.
+        
+        Parameters:
+        ----------
+         - date_string: str
+             The string in the compiled format
+            
+        Returns:
+        -------
+        datetime
+        """
+        if self._regex is None:
+            return datetime.strptime(date_string, self.date_format)
+
+        found = self._regex.fullmatch(date_string)
+        if found is None:
+            raise ValueError(f"time data {date_string!r} does not match format {self.date_format!r}")
+
+        parts = found.groupdict()
+        if parts.get("Y") is not None:
+            year = int(parts["Y"])
+        elif parts.get("y") is not None:
+            year = int(parts["y"])
+            year += 2000 if year <= 68 else 1900
+        else:
+            year = 1900
+
+        return datetime(
+            year,
+            int(parts.get("m") or 1),
+            int(parts.get("d") or 1),
+            int(parts.get("H") or 0),
+            int(parts.get("M") or 0),
+            int(parts.get("S") or 0),
+        )
 
 
 # COMMAND ----------
@@ -82,8 +227,24 @@ class DateGetter:
                  include_last_date: bool = False, convert_result_to_str: bool = False) -> list:
         returns the list of days within the date range with the given parameters
     
+    - date_range_array(self, dt_start: Union[str, datetime.date, None] = None, dt_end: Union[str, datetime.date, None] = None,
+                       step: int = 1, step_type: str = "day", str_format: Union[str, None] = None,
+                       include_last_date: bool = False, convert_result_to_str: bool = False) -> np.ndarray:
+        returns the date range as a NumPy datetime64 array generated in one batch
+    
+    - format_dates_array(cls, dates_array: np.ndarray, date_format: str) -> np.ndarray:
+        formats an array of dates to strings in bulk
+    
+    - iter_dates(self, dt_start: Union[str, datetime.date, None] = None, dt_end: Union[str, datetime.date, None] = None,
+                 step: int = 1, step_type: str = "day", periods: Union[int, None] = None, str_format: Union[str, None] = None,
+                 include_last_date: bool = False, convert_result_to_str: bool = False) -> Iterator:
+        lazily yields the dates of the range, supports descending and open-ended ranges
+    
     - date_format_to_string(self, date_format: Union[str, None] = None) -> str:
         formats the present date object to a specific string format
+    
+    - freeze(self) -> "DateValue":
+        returns an immutable DateValue copy of the present date
     """
     
     d_raises = {
@@ -93,36 +254,49 @@ class DateGetter:
         " please provide dt_end parameter in datetime.date type or str type with format to convert.",
         "missed_range_start_date": "Error in date range creating,"
         " please provide dt_start parameter in datetime.date type or str type with format to convert.",
+        "invalid_range_step": "Error in date range creating, step must be a non-zero integer.",
+        "invalid_range_step_type": "Error in date range creating,"
+        " step_type must be one of < 'day', 'week', 'month', 'year' >.",
+        "invalid_range_periods": "Error in date range creating, periods must be a non-negative integer or None.",
     }
 
+    d_quarters = {1: "JFM", 2: "AMJ", 3: "JAS", 4: "OND"}
+
+    d_array_formats = ("%Y", "%y", "%m", "%d", "%j", "%H", "%M", "%S", "%QNUM", "%QAR", "%%")
+
     def __init__(
         self,
-        initial_date: Union[datetime.date, str] = date.today(),
+        initial_date: Union[datetime.date, str, None] = None,
         format: Union[str, None] = None,
+        fy_month: int = 7,
     ) -> None:
         """
         Initializes the DateGetter class.
         
         Parameters:
         ----------
-         - initial_date: Union[datetime.date, str]
-             A datetime date object or string for the base date used to manipulate date range.
+         - initial_date: Union[datetime.date, str, None]
+             A datetime date object or string for the base date used to manipulate date range, today by default.
             
          - format: Union[str, None]
              The specified format for string to datetime object conversion, None by default
             
+         - fy_month: int
+             The first month of the Fiscal Year, July by default
+            
         Returns:
         -------
         None
         """
-        self.date_calc = initial_date
+        self.date_calc = date.today() if initial_date is None else initial_date
         self.format = format
+        self.fy_month = fy_month
         
         if type(self.date_calc) == str:
             if self.format is None:
                 raise TypeError(self.d_raises["missed_date_format"])
                 
-            self.date_calc = datetime.strptime(self.date_calc, self.format)
+            self.date_calc = CompiledDateFormat.cached(self.format).parse(self.date_calc)
 
     def next_month(self, month_lag: int = 1) -> "DateGetter":
         """
@@ -355,12 +529,10 @@ class DateGetter:
         -------
         DateGetter object
         """
-        fy_month = 7
-        
-        if self.date_calc.month < fy_month:
-            self.date_calc = date(self.date_calc.year - 1, fy_month, 1)
+        if self.date_calc.month < self.fy_month:
+            self.date_calc = date(self.date_calc.year - 1, self.fy_month, 1)
         else:
-            self.date_calc = date(self.date_calc.year, fy_month, 1)
+            self.date_calc = date(self.date_calc.year, self.fy_month, 1)
         return self
 
     @property
@@ -395,8 +567,34 @@ class DateGetter:
         -------
         str
         """
-        quarters_map_dict = {1: "JFM", 2: "AMJ", 3: "JAS", 4: "OND"}
-        return quarters_map_dict[self.calculate_quarter_num]
+        return self.d_quarters[self.calculate_quarter_num]
+
+    def _check_range_date(
+        self, date_to_check: Union[str, datetime.date, None], str_format: Union[str, None], message_key: str
+    ) -> datetime.date:
+        """
+        Converts a range boundary to a date object and validates it.
+        
+        Parameters:
+        ----------
+         - date_to_check: Union[str, datetime.date, None]
+             The range boundary, a date object or a string in str_format
+            
+         - str_format: Union[str, None]
+             The format for string to datetime object conversion
+            
+         - message_key: str
+             The key of d_raises used when the boundary is invalid
+            
+        Returns:
+        -------
+        datetime.date
+        """
+        if isinstance(date_to_check, str) and str_format is not None:
+            date_to_check = CompiledDateFormat.cached(str_format).parse(date_to_check)
+        if date_to_check is None or not isinstance(date_to_check, date):
+            raise ValueError(self.d_raises[message_key])
+        return date_to_check
 
     def date_range(
         self,
@@ -449,26 +647,65 @@ class DateGetter:
             "year": relativedelta(years=step),
         }
         
-        def date_check(date_to_check, message_key: str):
-            if isinstance(date_to_check, str) and str_format is not None:
-                date_to_check = datetime.strptime(date_to_check, str_format)
-            if date_to_check is None:
-                raise ValueError(self.d_raises[message_key])
-            elif not isinstance(date_to_check, date):
-                raise ValueError(self.d_raises[message_key])
-            return date_to_check
-        
-        dt_start = date_check(dt_start, "missed_range_start_date")
-        dt_end = date_check(dt_end, "missed_range_end_date")
+        dt_start = self._check_range_date(dt_start, str_format, "missed_range_start_date")
+        dt_end = self._check_range_date(dt_end, str_format, "missed_range_end_date")
+
+        if getattr(dt_start, "tzinfo", None) is not None or getattr(dt_end, "tzinfo", None) is not None:
+            return self._date_range_loop(
+                dt_start, dt_end, d_steps[step_type], str_format, include_last_date, convert_result_to_str
+            )
+
+        dates_generated = self.date_range_array(
+            dt_start, dt_end, step, step_type, str_format, include_last_date, convert_result_to_str
+        )
+
+        return dates_generated.tolist()
 
+    def _date_range_loop(
+        self,
+        dt_start: datetime.date,
+        dt_end: datetime.date,
+        step_delta: relativedelta,
+        str_format: Union[str, None],
+        include_last_date: bool,
+        convert_result_to_str: bool,
+    ) -> list:
+        """
+        Reference step-by-step implementation of the date range, used for timezone aware dates
+        and as a baseline for benchmarking the array engine.
+        
+        Parameters:
+        ----------
+         - dt_start: datetime.date
+             The starting date of the date range
+            
+         - dt_end: datetime.date
+             The end date of the date range
+            
+         - step_delta: relativedelta
+             The step added on every iteration
+            
+         - str_format: Union[str, None]
+             The format of the resulting date string
+            
+         - include_last_date: bool
+             A boolean type to indicate whether or not to include end date to the date range
+            
+         - convert_result_to_str: bool
+             A boolean type to indicate whether or not to convert the resulting list of days to string format
+            
+        Returns:
+        -------
+        list
+        """
         date_initial = dt_start
 
         dates_generated = []
         while date_initial <= dt_end:
             dates_generated.append(date_initial)
-            date_initial += d_steps[step_type]
+            date_initial += step_delta
 
-        if include_last_date and dt_end not in dates_generated:
+        if include_last_date and (not dates_generated or dates_generated[-1] != dt_end):
             dates_generated.append(dt_end)
 
         if str_format is not None and convert_result_to_str:
@@ -478,6 +715,291 @@ class DateGetter:
 
         return dates_generated
 
+    def date_range_array(
+        self,
+        dt_start: Union[str, datetime.date, None] = None,
+        dt_end: Union[str, datetime.date, None] = None,
+        step: int = 1,
+        step_type: str = "day",
+        str_format: Union[str, None] = None,
+        include_last_date: bool = False,
+        convert_result_to_str: bool = False,
+    ) -> np.ndarray:
+        """
+        Returns the date range as a NumPy array, generated in one batch instead of step by step.
+        Month and year steps keep the relativedelta semantics of date_range: the day is clipped
+        to the month length and stays clipped for the following steps (Jan 31 -> Feb 28 -> Mar 28).
+        
+        Parameters:
+        ----------
+         - dt_start: Union[str, datetime.date, None] = None
+             The starting date of the date range, default set to present date
+            
+         - dt_end: Union[str, datetime.date, None] = None
+             The end date of the date range
+            
+         - step: int = 1
+             The integer step value with which to generate the array
+            
+         - step_type: str = "day"
+             The time unit value to step by date range
+            
+         - str_format: Union[str, None] = None
+             The format of the resulting date string, default set to object's format
+            
+         - include_last_date: bool = False
+             A boolean type to indicate whether or not to include end date to the date range
+            
+         - convert_result_to_str: bool = False
+             A boolean type to indicate whether or not to convert the resulting array of days to string format
+            
+        Returns:
+        -------
+        np.ndarray
+            datetime64[D] array for dates, datetime64[us] array for datetimes, object array of str
+            when convert_result_to_str is set
+        """
+        dt_start = dt_start or self.date_calc
+        str_format = str_format or self.format
+        step = abs(step)
+
+        if step == 0:
+            raise ValueError(self.d_raises["invalid_range_step"])
+        if step_type not in ("day", "week", "month", "year"):
+            raise ValueError(self.d_raises["invalid_range_step_type"])
+
+        dt_start = self._check_range_date(dt_start, str_format, "missed_range_start_date")
+        dt_end = self._check_range_date(dt_end, str_format, "missed_range_end_date")
+
+        unit = "us" if isinstance(dt_start, datetime) else "D"
+        start = np.datetime64(dt_start, unit)
+        end = np.datetime64(dt_end, unit)
+
+        if step_type in ("day", "week"):
+            days = step * 7 if step_type == "week" else step
+            dates_generated = np.arange(
+                start, end + np.timedelta64(1, unit), np.timedelta64(days, "D"), dtype=f"datetime64[{unit}]"
+            )
+        else:
+            months = step * 12 if step_type == "year" else step
+            start_day = start.astype("datetime64[D]")
+            start_month = start.astype("datetime64[M]")
+            time_of_day = start - start_day
+            n_steps = max(int((end.astype("datetime64[M]") - start_month).astype(int)) // months + 2, 0)
+
+            month_starts = start_month + np.arange(n_steps) * months
+            month_lengths = (
+                (month_starts + 1).astype("datetime64[D]") - month_starts.astype("datetime64[D]")
+            ).astype(int)
+            first_day = int((start_day - start_month.astype("datetime64[D]")).astype(int)) + 1
+            days = np.minimum.accumulate(np.minimum(first_day, month_lengths))
+
+            dates_generated = month_starts.astype("datetime64[D]") + (days - 1) + time_of_day
+            dates_generated = dates_generated[: np.searchsorted(dates_generated, end, side="right")]
+
+        if include_last_date and (dates_generated.size == 0 or dates_generated[-1] != end):
+            dates_generated = np.append(dates_generated, end)
+
+        if str_format is not None and convert_result_to_str:
+            dates_generated = self.format_dates_array(dates_generated, str_format)
+
+        return dates_generated
+
+    @classmethod
+    def format_dates_array(cls, dates_array: np.ndarray, date_format: str) -> np.ndarray:
+        """
+        Formats an array of dates to strings in bulk, with the same tokens as date_format_to_string
+        (including the custom %QAR and %QNUM). Numeric tokens are built with NumPy string operations,
+        any other strftime token falls back to per-element formatting.
+        
+        Parameters:
+        ----------
+         - dates_array: np.ndarray
+             An array of datetime64 values
+            
+         - date_format: str
+             The format of the date strings to be returned
+            
+        Returns:
+        -------
+        np.ndarray
+        """
+        dates_array = np.asarray(dates_array, dtype="datetime64[us]")
+        if dates_array.size == 0:
+            return np.array([], dtype=object)
+
+        tokens = re.findall(r"%QAR|%QNUM|%.|[^%]+", date_format)
+
+        months = dates_array.astype("datetime64[M]").astype(int) % 12 + 1
+        quarters = (months - 1) // 3 + 1
+
+        if any(_.startswith("%") and _ not in cls.d_array_formats for _ in tokens):
+            result = np.empty(dates_array.shape, dtype=object)
+            for quarter in np.unique(quarters):
+                quarter_format = cls._format_quarter_tokens(date_format, quarter)
+                mask = quarters == quarter
+                result[mask] = [_.strftime(quarter_format) for _ in dates_array[mask].tolist()]
+            return result
+
+        days = dates_array.astype("datetime64[D]")
+        years = days.astype("datetime64[Y]").astype(int) + 1970
+        seconds = (dates_array - days).astype("timedelta64[s]").astype(int)
+        parts = {
+            "%Y": lambda: np.char.zfill(years.astype(str), 4),
+            "%y": lambda: np.char.zfill((years % 100).astype(str), 2),
+            "%m": lambda: np.char.zfill(months.astype(str), 2),
+            "%d": lambda: np.char.zfill(
+                ((days - days.astype("datetime64[M]")).astype(int) + 1).astype(str), 2
+            ),
+            "%j": lambda: np.char.zfill(
+                ((days - days.astype("datetime64[Y]")).astype(int) + 1).astype(str), 3
+            ),
+            "%H": lambda: np.char.zfill((seconds // 3600).astype(str), 2),
+            "%M": lambda: np.char.zfill((seconds // 60 % 60).astype(str), 2),
+            "%S": lambda: np.char.zfill((seconds % 60).astype(str), 2),
+            "%QNUM": lambda: quarters.astype(str),
+            "%QAR": lambda: np.array(list(cls.d_quarters.values()))[quarters - 1],
+            "%%": lambda: np.full(dates_array.shape, "%"),
+        }
+
+        result = np.full(dates_array.shape, "", dtype=str)
+        for token in tokens:
+            part = parts[token]() if token in parts else np.full(dates_array.shape, token)
+            result = np.char.add(result, part)
+        return result.astype(object)
+
+    def iter_dates(
+        self,
+        dt_start: Union[str, datetime.date, None] = None,
+        dt_end: Union[str, datetime.date, None] = None,
+        step: int = 1,
+        step_type: str = "day",
+        periods: Union[int, None] = None,
+        str_format: Union[str, None] = None,
+        include_last_date: bool = False,
+        convert_result_to_str: bool = False,
+    ) -> Iterator:
+        """
+        Lazily yields the dates of the range one by one, so the caller can stop early
+        (e.g. with break or itertools.islice) without building the whole list.
+        A negative step walks the range backwards, dt_end is then the lower bound.
+        Without dt_end the range is bounded by periods only, without both it is endless.
+        
+        Parameters:
+        ----------
+         - dt_start: Union[str, datetime.date, None] = None
+             The starting date of the date range, default set to present date
+            
+         - dt_end: Union[str, datetime.date, None] = None
+             The end date of the date range, None for an open-ended range
+            
+         - step: int = 1
+             The integer step value, negative for a descending range
+            
+         - step_type: str = "day"
+             The time unit value to step by date range
+            
+         - periods: Union[int, None] = None
+             The maximum number of dates to yield, None for no limit
+            
+         - str_format: Union[str, None] = None
+             The format of the resulting date string, default set to object's format
+            
+         - include_last_date: bool = False
+             A boolean type to indicate whether or not to include end date to the date range
+            
+         - convert_result_to_str: bool = False
+             A boolean type to indicate whether or not to yield the dates in string format
+            
+        Returns:
+        -------
+        Iterator
+        """
+        dt_start = dt_start or self.date_calc
+        str_format = str_format or self.format
+
+        if step == 0:
+            raise ValueError(self.d_raises["invalid_range_step"])
+        if periods is not None and periods < 0:
+            raise ValueError(self.d_raises["invalid_range_periods"])
+
+        d_steps = {
+            "day": timedelta(days=step),
+            "week": timedelta(weeks=step),
+            "month": relativedelta(months=step),
+            "year": relativedelta(years=step),
+        }
+        if step_type not in d_steps:
+            raise ValueError(self.d_raises["invalid_range_step_type"])
+        step_delta = d_steps[step_type]
+
+        dt_start = self._check_range_date(dt_start, str_format, "missed_range_start_date")
+        if dt_end is not None:
+            dt_end = self._check_range_date(dt_end, str_format, "missed_range_end_date")
+
+        to_str = str_format is not None and convert_result_to_str
+
+        def generate():
+            date_initial = dt_start
+            date_last = None
+            generated = 0
+
+            while periods is None or generated < periods:
+                if dt_end is not None and (date_initial < dt_end if step < 0 else date_initial > dt_end):
+                    break
+                yield self._format_date(date_initial, str_format) if to_str else date_initial
+                date_last = date_initial
+                generated += 1
+                date_initial += step_delta
+
+            if (
+                include_last_date
+                and dt_end is not None
+                and date_last != dt_end
+                and (periods is None or generated < periods)
+            ):
+                yield self._format_date(dt_end, str_format) if to_str else dt_end
+
+        return generate()
+
+    @classmethod
+    def _format_date(cls, date_value: datetime.date, date_format: str) -> str:
+        """
+        Formats a date object to a string, replacing the custom %QAR and %QNUM tokens.
+        
+        Parameters:
+        ----------
+         - date_value: datetime.date
+             The date object to be formatted
+            
+         - date_format: str
+             The format of the date string to be returned
+            
+        Returns:
+        -------
+        str
+        """
+        return CompiledDateFormat.cached(date_format).format(date_value)
+
+    @classmethod
+    def _format_quarter_tokens(cls, date_format: str, quarter: int) -> str:
+        """
+        Replaces the custom %QAR and %QNUM tokens of the format with the values of the given quarter.
+        
+        Parameters:
+        ----------
+         - date_format: str
+             The format with custom tokens
+            
+         - quarter: int
+             The quarter number
+            
+        Returns:
+        -------
+        str
+        """
+        return date_format.replace("%QAR", cls.d_quarters[quarter]).replace("%QNUM", str(quarter))
+
     def date_format_to_string(self, date_format: Union[str, None] = None) -> str:
         """
         Formats the present date object to a specific string format.
@@ -496,12 +1018,437 @@ class DateGetter:
         if date_format is None:
             raise TypeError(self.d_raises["missed_date_format"])
             
-        d_new_formats = {
-            "%QAR": self.get_string_quarter,
-            "%QNUM": self.calculate_quarter_num,
+        return self._format_date(self.date_calc, date_format)
+
+    def freeze(self) -> "DateValue":
+        """
+        Returns an immutable DateValue with the present date, format and FY start month.
+        
+        Returns:
+        -------
+        DateValue object
+        """
+        return DateValue(self.date_calc, self.format, self.fy_month)
+
+
+
+# COMMAND ----------
+
+class DateValue:
+    """
+    An immutable, hashable counterpart of DateGetter for keeping many dates in memory.
+    Instances use __slots__ instead of __dict__, and every transform returns a new DateValue
+    instead of changing the present one. The transforms have the same names and results as in DateGetter,
+    formatting and parsing go through CompiledDateFormat.cached.
+    
+    Methods:
+    --------
+    None:
+        initializes the class with the provided date and/or format, used to format initialization string to datetime object
+    
+    - next_month / next_day / next_week / prev_month / prev_day / prev_week(self, lag: int = 1) -> "DateValue":
+        returns the date moved by n months, days or weeks
+    
+    - set_day / set_month / set_year(self, new_value: int) -> "DateValue":
+        returns the date with the replaced day, month or year
+    
+    - month_start_date / month_end_date / week_start_date / week_end_date / quarter_start_date /
+      quarter_end_date / fy_start_date / fy_end_date -> "DateValue":
+        returns the start or end date of the present month, week, quarter or FY
+    
+    - calculate_quarter_num -> int:
+        returns the quarter number of the present date
+    
+    - get_string_quarter -> str:
+        returns the string representation of the present quarter
+    
+    - date_format_to_string(self, date_format: Union[str, None] = None) -> str:
+        formats the present date object to a specific string format
+    
+    - to_date_getter(self) -> DateGetter:
+        returns a mutable DateGetter with the same date, format and FY start month
+    """
+    
+    __slots__ = ("date_calc", "format", "fy_month")
+
+    def __init__(
+        self,
+        initial_date: Union[datetime.date, str, None] = None,
+        format: Union[str, None] = None,
+        fy_month: int = 7,
+    ) -> None:
+        """
+        Initializes the DateValue class.
+        
+        Parameters:
+        ----------
+         - initial_date: Union[datetime.date, str, None]
+             A datetime date object or string for the date, today by default.
+            
+         - format: Union[str, None]
+             The specified format for string to datetime object conversion, None by default
+            
+         - fy_month: int
+             The first month of the Fiscal Year, July by default
+            
+        Returns:
+        -------
+        None
+        """
+        if initial_date is None:
+            initial_date = date.today()
+        elif isinstance(initial_date, str):
+            if format is None:
+                raise TypeError(DateGetter.d_raises["missed_date_format"])
+            initial_date = CompiledDateFormat.cached(format).parse(initial_date)
+
+        object.__setattr__(self, "date_calc", initial_date)
+        object.__setattr__(self, "format", format)
+        object.__setattr__(self, "fy_month", fy_month)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable, use the transform methods instead.")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable, use the transform methods instead.")
+
+    def __reduce__(self):
+        return self.__class__, (self.date_calc, self.format, self.fy_month)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, DateValue):
+            return NotImplemented
+        return (self.date_calc, self.format, self.fy_month) == (other.date_calc, other.format, other.fy_month)
+
+    def __hash__(self) -> int:
+        return hash((self.date_calc, self.format, self.fy_month))
+
+    def __repr__(self) -> str:
+        return f"DateValue({self.date_calc!r}, format={self.format!r}, fy_month={self.fy_month})"
+
+    def _with_date(self, new_date: datetime.date) -> "DateValue":
+        new_value = object.__new__(DateValue)
+        object.__setattr__(new_value, "date_calc", new_date)
+        object.__setattr__(new_value, "format", self.format)
+        object.__setattr__(new_value, "fy_month", self.fy_month)
+        return new_value
+
+    def next_month(self, month_lag: int = 1) -> "DateValue":
+        return self._with_date(self.date_calc + relativedelta(months=month_lag))
+
+    def next_day(self, day_lag: int = 1) -> "DateValue":
+        return self._with_date(self.date_calc + relativedelta(days=day_lag))
+
+    def next_week(self, weeks_lag: int = 1) -> "DateValue":
+        return self._with_date(self.date_calc + relativedelta(weeks=weeks_lag))
+
+    def prev_month(self, month_lag: int = 1) -> "DateValue":
+        return self._with_date(self.date_calc - relativedelta(months=month_lag))
+
+    def prev_day(self, day_lag: int = 1) -> "DateValue":
+        return self._with_date(self.date_calc - relativedelta(days=day_lag))
+
+    def prev_week(self, weeks_lag: int = 1) -> "DateValue":
+        return self._with_date(self.date_calc - relativedelta(weeks=weeks_lag))
+
+    def set_day(self, new_day: int) -> "DateValue":
+        return self._with_date(self.date_calc.replace(day=new_day))
+
+    def set_month(self, new_month: int) -> "DateValue":
+        return self._with_date(self.date_calc.replace(month=new_month))
+
+    def set_year(self, new_year: int) -> "DateValue":
+        return self._with_date(self.date_calc.replace(year=new_year))
+
+    @property
+    def month_start_date(self) -> "DateValue":
+        return self._with_date(self.date_calc.replace(day=1))
+
+    @property
+    def month_end_date(self) -> "DateValue":
+        return self._with_date(
+            (self.date_calc + relativedelta(months=1)).replace(day=1) - relativedelta(days=1)
+        )
+
+    @property
+    def week_start_date(self) -> "DateValue":
+        return self._with_date(self.date_calc - timedelta(days=self.date_calc.weekday()))
+
+    @property
+    def week_end_date(self) -> "DateValue":
+        return self._with_date(self.date_calc + timedelta(days=6 - self.date_calc.weekday()))
+
+    @property
+    def quarter_start_date(self) -> "DateValue":
+        return self._with_date(date(self.date_calc.year, 3 * self.calculate_quarter_num - 2, 1))
+
+    @property
+    def quarter_end_date(self) -> "DateValue":
+        return self._with_date(
+            date(self.date_calc.year, 3 * self.calculate_quarter_num - 2, 1) + relativedelta(months=3, days=-1)
+        )
+
+    @property
+    def fy_start_date(self) -> "DateValue":
+        fy_year = self.date_calc.year - 1 if self.date_calc.month < self.fy_month else self.date_calc.year
+        return self._with_date(date(fy_year, self.fy_month, 1))
+
+    @property
+    def fy_end_date(self) -> "DateValue":
+        return self._with_date(self.fy_start_date.date_calc + relativedelta(years=1, days=-1))
+
+    @property
+    def calculate_quarter_num(self) -> int:
+        return (self.date_calc.month - 1) // 3 + 1
+
+    @property
+    def get_string_quarter(self) -> str:
+        return DateGetter.d_quarters[self.calculate_quarter_num]
+
+    def date_format_to_string(self, date_format: Union[str, None] = None) -> str:
+        """
+        Formats the present date object to a specific string format.
+        
+        Parameters:
+        ----------
+         - date_format: Union[str, None] = None
+             The format of the date string to be returned, default set to object's format
+            
+        Returns:
+        -------
+        str
+        """
+        date_format = date_format or self.format
+
+        if date_format is None:
+            raise TypeError(DateGetter.d_raises["missed_date_format"])
+
+        return CompiledDateFormat.cached(date_format).format(self.date_calc)
+
+    def to_date_getter(self) -> DateGetter:
+        """
+        Returns a mutable DateGetter with the same date, format and FY start month.
+        
+        Returns:
+        -------
+        DateGetter object
+        """
+        return DateGetter(self.date_calc, self.format, self.fy_month)
+
+
+# COMMAND ----------
+
+class CalendarIndex:
+    """
+    A precomputed calendar dimension for a span of dates with a configurable Fiscal Year start.
+    All attributes are built once with NumPy, a date lookup is an array index (O(1)).
+    Use CalendarIndex.cached to share one instance per span and FY start month.
+    
+    Attributes:
+    -----------
+     - columns: tuple
+         The attributes stored for every date
+    
+    Methods:
+    --------
+    - cached(cls, dt_start: datetime.date, dt_end: datetime.date, fy_month: int = 7) -> "CalendarIndex":
+        returns a memoized calendar index for the span
+    
+    - lookup(self, date_value: datetime.date) -> dict:
+        returns all attributes of the date
+    
+    - get(self, date_value: datetime.date, attribute: str):
+        returns one attribute of the date
+    
+    - to_pandas(self) -> pd.DataFrame:
+        exports the calendar as a pandas dataframe
+    
+    - to_spark(self, spark, broadcast: bool = True) -> "pyspark.sql.DataFrame":
+        exports the calendar as a Spark dataframe ready for a broadcast join
+    """
+    
+    columns = (
+        "date",
+        "week_start_date",
+        "week_end_date",
+        "month_start_date",
+        "month_end_date",
+        "quarter_start_date",
+        "quarter_end_date",
+        "quarter_num",
+        "quarter_str",
+        "fy_start_date",
+        "fy_end_date",
+    )
+    
+    d_raises = {
+        "invalid_span": "Error in calendar creating, dt_end must not be earlier than dt_start.",
+        "invalid_fy_month": "Error in calendar creating, fy_month must be between 1 and 12.",
+        "date_out_of_span": "Error in calendar lookup, date {date_value} is outside of the calendar span {dt_start} - {dt_end}.",
+    }
+
+    def __init__(self, dt_start: datetime.date, dt_end: datetime.date, fy_month: int = 7) -> None:
+        """
+        Initializes the CalendarIndex class and builds all attributes for the span.
+        
+        Parameters:
+        ----------
+         - dt_start: datetime.date
+             The first date of the calendar
+            
+         - dt_end: datetime.date
+             The last date of the calendar, included
+            
+         - fy_month: int
+             The first month of the Fiscal Year, July by default
+            
+        Returns:
+        -------
+        None
+        """
+        dt_start = self._as_date(dt_start)
+        dt_end = self._as_date(dt_end)
+        if dt_end < dt_start:
+            raise ValueError(self.d_raises["invalid_span"])
+        if not 1 <= fy_month <= 12:
+            raise ValueError(self.d_raises["invalid_fy_month"])
+
+        self.dt_start = dt_start
+        self.dt_end = dt_end
+        self.fy_month = fy_month
+        self._start = np.datetime64(dt_start, "D")
+
+        days = np.arange(self._start, np.datetime64(dt_end, "D") + 1, dtype="datetime64[D]")
+        months = days.astype("datetime64[M]")
+        month_num = months.astype(int) % 12 + 1
+        quarter_num = (month_num - 1) // 3 + 1
+        quarter_start = months - (month_num - 1) % 3
+        fy_start = months - (month_num - fy_month) % 12
+        week_start = days - (days.astype(int) + 3) % 7
+
+        self._arrays = {
+            "date": days,
+            "week_start_date": week_start,
+            "week_end_date": week_start + 6,
+            "month_start_date": months.astype("datetime64[D]"),
+            "month_end_date": (months + 1).astype("datetime64[D]") - 1,
+            "quarter_start_date": quarter_start.astype("datetime64[D]"),
+            "quarter_end_date": (quarter_start + 3).astype("datetime64[D]") - 1,
+            "quarter_num": quarter_num,
+            "quarter_str": np.array(list(DateGetter.d_quarters.values()))[quarter_num - 1],
+            "fy_start_date": fy_start.astype("datetime64[D]"),
+            "fy_end_date": (fy_start + 12).astype("datetime64[D]") - 1,
         }
+
+    @classmethod
+    @lru_cache(maxsize=32)
+    def cached(cls, dt_start: datetime.date, dt_end: datetime.date, fy_month: int = 7) -> "CalendarIndex":
+        """
+        Returns a memoized calendar index, built only on the first call for the span and FY start month.
+        
+        Parameters:
+        ----------
+         - dt_start: datetime.date
+             The first date of the calendar
+            
+         - dt_end: datetime.date
+             The last date of the calendar, included
+            
+         - fy_month: int
+             The first month of the Fiscal Year, July by default
+            
+        Returns:
+        -------
+        CalendarIndex object
+        """
+        return cls(dt_start, dt_end, fy_month)
+
+    def __len__(self) -> int:
+        return len(self._arrays["date"])
+
+    def __contains__(self, date_value: datetime.date) -> bool:
+        return self.dt_start <= self._as_date(date_value) <= self.dt_end
+
+    @staticmethod
+    def _as_date(date_value: datetime.date) -> datetime.date:
+        return date_value.date() if isinstance(date_value, datetime) else date_value
+
+    def _position(self, date_value: datetime.date) -> int:
+        date_value = self._as_date(date_value)
+        if not self.dt_start <= date_value <= self.dt_end:
+            raise KeyError(
+                self.d_raises["date_out_of_span"].format(
+                    date_value=date_value, dt_start=self.dt_start, dt_end=self.dt_end
+                )
+            )
+        return (date_value - self.dt_start).days
+
+    def get(self, date_value: datetime.date, attribute: str):
+        """
+        Returns one attribute of the date.
+        
+        Parameters:
+        ----------
+         - date_value: datetime.date
+             The date to look up
+            
+         - attribute: str
+             One of CalendarIndex.columns
+            
+        Returns:
+        -------
+        datetime.date, int or str
+        """
+        return self._arrays[attribute][self._position(date_value)].item()
+
+    def lookup(self, date_value: datetime.date) -> dict:
+        """
+        Returns all attributes of the date.
         
-        for nfc, nfr in d_new_formats.items():
-            date_format = date_format.replace(nfc, str(nfr))
+        Parameters:
+        ----------
+         - date_value: datetime.date
+             The date to look up
             
-        return self.date_calc.strftime(date_format)
+        Returns:
+        -------
+        dict
+        """
+        position = self._position(date_value)
+        return {column: self._arrays[column][position].item() for column in self.columns}
+
+    __getitem__ = lookup
+
+    def to_pandas(self) -> pd.DataFrame:
+        """
+        Exports the calendar as a pandas dataframe, one row per date.
+        
+        Returns:
+        -------
+        pd.DataFrame
+        """
+        return pd.DataFrame({column: self._arrays[column] for column in self.columns})
+
+    def to_spark(self, spark, broadcast: bool = True) -> "pyspark.sql.DataFrame":
+        """
+        Exports the calendar as a Spark dataframe with date typed columns.
+        
+        Parameters:
+        ----------
+         - spark: SparkSession
+             The active Spark session
+            
+         - broadcast: bool = True
+             A boolean type to indicate whether or not to add a broadcast hint for joins
+            
+        Returns:
+        -------
+        pyspark.sql.DataFrame
+        """
+        df = spark.createDataFrame(self.to_pandas()).selectExpr(
+            *[
+                f"CAST({column} AS DATE) AS {column}" if column.endswith("date") else column
+                for column in self.columns
+            ]
+        )
+        return df.hint("broadcast") if broadcast else df
@@ -0,0 +1,214 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC Benchmark suite for both copies of the date logic:
+# MAGIC - `dates_handle_lib` - this repository notebook
+# MAGIC - `ee_srlib.date_handle` - the packaged module, imported from the installed wheel or loaded from `ee_sr_libraries.zip`
+# MAGIC
+# MAGIC Every case is timed for every copy, the results are written as JSON and compared against the stored baseline
+# MAGIC (`dates_handle_lib_benchmark_baseline.json`). A case slower than the baseline by more than the tolerance is a regression.
+# MAGIC `date_range_*_loop` cases time the step-by-step `_date_range_loop` of the same copy, `engine_speedup` is loop time / array engine time.
+# MAGIC
+# MAGIC Runs offline, as a notebook or with:
+# MAGIC - `python dates_handle_lib_benchmark.py` - run and compare with the baseline
+# MAGIC - `python dates_handle_lib_benchmark.py --save-baseline` - run and store the results as the new baseline
+# MAGIC - `python dates_handle_lib_benchmark.py --output results.json --tolerance 0.5`
+
+# COMMAND ----------
+
+import argparse
+import json
+import os
+import platform
+import sys
+import types
+import zipfile
+from datetime import date, datetime
+from timeit import repeat
+from dateutil.relativedelta import relativedelta
+
+# COMMAND ----------
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__)) if "__file__" in globals() else os.getcwd()
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "dates_handle_lib_benchmark_baseline.json")
+PACKAGE_ZIP_PATH = os.path.join(BENCHMARK_DIR, "ee_sr_libraries.zip")
+PACKAGE_ZIP_MEMBER = "ee_sr_libraries/ee_srlib/date_handle/date_handle.py"
+
+# COMMAND ----------
+
+def load_implementations() -> dict:
+  """
+  Returns the DateGetter class of every available copy of the date logic, keyed by copy name.
+  """
+  from dates_handle_lib import DateGetter
+
+  implementations = {"dates_handle_lib": DateGetter}
+
+  try:
+    from ee_srlib.date_handle.date_handle import DateGetter as PackagedDateGetter
+  except ImportError:
+    PackagedDateGetter = None
+    if os.path.exists(PACKAGE_ZIP_PATH):
+      with zipfile.ZipFile(PACKAGE_ZIP_PATH) as package_zip:
+        source = package_zip.read(PACKAGE_ZIP_MEMBER).decode("utf-8")
+      module = types.ModuleType("ee_srlib_date_handle")
+      exec(compile(source, PACKAGE_ZIP_MEMBER, "exec"), module.__dict__)
+      PackagedDateGetter = module.DateGetter
+
+  if PackagedDateGetter is not None:
+    implementations["ee_srlib.date_handle"] = PackagedDateGetter
+
+  return implementations
+
+# COMMAND ----------
+
+def build_cases(DateGetter) -> dict:
+  """
+  Returns the benchmark cases for one DateGetter implementation as {case name: (callable, calls per run)}.
+  """
+  date_strings = [date.fromordinal(730000 + i).strftime("%Y-%m-%d") for i in range(1000)]
+
+  def construct_from_strings():
+    for date_string in date_strings:
+      DateGetter(date_string, "%Y-%m-%d")
+
+  def chained_moves():
+    for _ in range(1000):
+      DateGetter(date(2024, 1, 31)).next_month(2).prev_week(3).next_day(10).prev_month().month_end_date
+
+  def format_custom_tokens():
+    getter = DateGetter(date(2024, 5, 17))
+    for _ in range(1000):
+      getter.date_format_to_string("%Y-%m-%d %QAR Q%QNUM")
+
+  cases = {
+    "construct_from_strings_x1000": (construct_from_strings, 1),
+    "chained_moves_x1000": (chained_moves, 1),
+    "format_custom_tokens_x1000": (format_custom_tokens, 1),
+  }
+
+  spans = {
+    "short": (date(2024, 1, 31), date(2024, 12, 31)),
+    "long": (date(1900, 1, 31), date(2099, 12, 31)),
+  }
+  for step_type in ("day", "week", "month", "year"):
+    for span_name, (dt_start, dt_end) in spans.items():
+      for to_str in (False, True):
+        case_name = f"date_range_{step_type}_{span_name}" + ("_str" if to_str else "")
+        cases[case_name] = (
+          lambda dt_start=dt_start, dt_end=dt_end, step_type=step_type, to_str=to_str: DateGetter().date_range(
+            dt_start, dt_end, step_type=step_type, str_format="%Y-%m-%d", include_last_date=True, convert_result_to_str=to_str
+          ),
+          100 if span_name == "short" else 1,
+        )
+        # the step-by-step reference implementation, the baseline the array engine is measured against
+        if hasattr(DateGetter, "_date_range_loop"):
+          cases[case_name + "_loop"] = (
+            lambda dt_start=dt_start, dt_end=dt_end, step_type=step_type, to_str=to_str: DateGetter()._date_range_loop(
+              dt_start, dt_end, relativedelta(**{step_type + "s": 1}), "%Y-%m-%d", True, to_str
+            ),
+            100 if span_name == "short" else 1,
+          )
+
+  return cases
+
+# COMMAND ----------
+
+def run_benchmark(repeats: int = 5) -> dict:
+  """
+  Times every case for every implementation after one warm-up call, keeping the best of the repeats.
+  """
+  results = {
+    "created_at": datetime.now().isoformat(timespec="seconds"),
+    "python": platform.python_version(),
+    "machine": platform.machine(),
+    "repeats": repeats,
+    "results": {},
+  }
+
+  for implementation_name, DateGetter in load_implementations().items():
+    for case_name, (case, number) in build_cases(DateGetter).items():
+      case()
+      best = min(repeat(case, number=number, repeat=repeats)) / number
+      results["results"][f"{implementation_name}::{case_name}"] = round(best, 6)
+
+  results["engine_speedup"] = {
+    case_name[:-len("_loop")]: round(seconds / results["results"][case_name[:-len("_loop")]], 2)
+    for case_name, seconds in results["results"].items()
+    if case_name.endswith("_loop") and results["results"].get(case_name[:-len("_loop")])
+  }
+
+  return results
+
+# COMMAND ----------
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+  """
+  Compares the results with the baseline and returns one row per case with the ratio and the status:
+  'regression' when slower than the baseline by more than the tolerance, 'improvement' when faster by more than it.
+  """
+  comparison = []
+  for case_name, seconds in results["results"].items():
+    baseline_seconds = baseline.get("results", {}).get(case_name)
+    if baseline_seconds is None:
+      status, ratio = "new", None
+    else:
+      ratio = round(seconds / baseline_seconds, 3) if baseline_seconds else None
+      if ratio is not None and ratio > 1 + tolerance:
+        status = "regression"
+      elif ratio is not None and ratio < 1 / (1 + tolerance):
+        status = "improvement"
+      else:
+        status = "ok"
+    comparison.append({
+      "case": case_name,
+      "seconds": seconds,
+      "baseline_seconds": baseline_seconds,
+      "ratio": ratio,
+      "status": status,
+    })
+  return comparison
+
+# COMMAND ----------
+
+def main(argv: list) -> int:
+  parser = argparse.ArgumentParser(description="Benchmark dates_handle_lib and ee_srlib.date_handle.")
+  parser.add_argument("--repeats", type=int, default=5, help="timing repeats per case, the best one is kept")
+  parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative slowdown against the baseline")
+  parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+  parser.add_argument("--output", default=None, help="write the results and comparison JSON to this file")
+  parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+  args, _ = parser.parse_known_args(argv)
+
+  results = run_benchmark(args.repeats)
+
+  if args.save_baseline:
+    with open(args.baseline, "w") as baseline_file:
+      json.dump(results, baseline_file, indent=2, sort_keys=True)
+      baseline_file.write("\n")
+    print(f"Baseline saved to {args.baseline}")
+    return 0
+
+  baseline = {}
+  if os.path.exists(args.baseline):
+    with open(args.baseline) as baseline_file:
+      baseline = json.load(baseline_file)
+  results["comparison"] = compare_with_baseline(results, baseline, args.tolerance)
+
+  if args.output:
+    with open(args.output, "w") as output_file:
+      json.dump(results, output_file, indent=2, sort_keys=True)
+  else:
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+  regressions = [row["case"] for row in results["comparison"] if row["status"] == "regression"]
+  if regressions:
+    print(f"Regressions against the baseline: {regressions}", file=sys.stderr)
+    return 1
+  return 0
+
+# COMMAND ----------
+
+if __name__ == "__main__":
+  exit_code = main(sys.argv[1:])
+  if "dbutils" not in globals():
+    sys.exit(exit_code)
@@ -1,5 +1,11 @@
 # Databricks notebook source
-from pyspark.sql.functions import col, count, split
+import uuid
+
+from pyspark import StorageLevel
+from pyspark.sql.functions import col, count, split, when, trim, approx_count_distinct, struct, lit, concat_ws, xxhash64, current_timestamp, coalesce
+from pyspark.sql.functions import max as spark_max, sum as spark_sum
+from pyspark.sql.types import StructType, StructField, StringType, LongType, DoubleType, FloatType, DecimalType, DateType, TimestampType
+from pyspark.sql.types import AtomicType, BinaryType, IntegralType, NumericType
 
 class SparkDFUnitTests:
   
@@ -10,7 +16,8 @@ class SparkDFUnitTests:
     duplicates_test - dataframe testing for duplicates
     nulls_test - dataframe testing for null values
     spaces_in_data - dataframe testing for spaces in rows in selected columns
-    missing_values - matches the columns of the two dataframes and looks for lost values.
+    missing_values - matches the columns of the two dataframes and looks for lost distinct values in both directions with anti-joins.
+    nulls_and_spaces_test - nulls and spaces tests for all selected columns in one aggregation pass, with per-column counters
     The methods of application can be seen below
     
   Result returned by method: 1 or 0 + Description of problem if 0
@@ -43,39 +50,85 @@ class SparkDFUnitTests:
     
     if SparkDFUnitTests.type_chek(cols):
 
-      d = dict()
-      ls = df.columns
-      for ix, value in enumerate(ls):
-        d[ix] = value
-
-      ls = []
-      for col in cols:
-        cl = d.get(col)
-        ls.append(cl)
+      columns = df.columns
+      ls = [columns[ix] if 0 <= ix < len(columns) else None for ix in cols]
         
     else:
       ls = cols
       
     return ls
   
+  def __common_type(left_type, right_type):
+    """
+    Type both columns of a compared pair are cast to without losing values (wider numeric type, timestamp or string).
+    Raises ValueError when there is no such type, a lossy cast would make missing values look matched.
+    """
+    
+    if left_type == right_type:
+      return left_type
+    if isinstance(left_type, NumericType) and isinstance(right_type, NumericType):
+      if isinstance(left_type, IntegralType) and isinstance(right_type, IntegralType):
+        return LongType()
+      if isinstance(left_type, (FloatType, DoubleType)) or isinstance(right_type, (FloatType, DoubleType)):
+        return DoubleType()
+      # decimal with decimal or integral, integral types need decimal(20, 0) like in Spark
+      bounds = [(t.precision - t.scale, t.scale) if isinstance(t, DecimalType) else (20, 0) for t in (left_type, right_type)]
+      digits, scale = max(b[0] for b in bounds), max(b[1] for b in bounds)
+      if digits + scale <= 38:
+        return DecimalType(digits + scale, scale)
+    elif isinstance(left_type, (DateType, TimestampType)) and isinstance(right_type, (DateType, TimestampType)):
+      return TimestampType()
+    elif (isinstance(left_type, StringType) or isinstance(right_type, StringType)) and all(
+      isinstance(t, AtomicType) and not isinstance(t, BinaryType) for t in (left_type, right_type)
+    ):
+      return StringType()
+    raise ValueError(f'[Types {left_type.simpleString()} and {right_type.simpleString()} can not be compared without losing values.]')
   
   
-  def duplicates_test(self, cols):
+  
+  def duplicates_test(self, cols, approximate=False, rsd=0.01, sample_size=20):
+    """
+    Looks for rows sharing the same key (cols).
+    
+    Args:
+      cols - key columns, ix or names
+      approximate - two-tier mode: compare approx_count_distinct of the key to the row count first (one cheap job)
+        and run the exact grouped report only when the approximate check indicates duplicates, ie - the approximate
+        distinct count is lower than the row count by more than the estimation error (3 * rsd).
+        Known limit: the test passes on the estimate alone, so duplicates below that error (about 3% of the rows
+        with the default rsd) are not reported. Use the exact mode (default) when any duplicate has to fail the test.
+      rsd - maximum relative standard deviation for approx_count_distinct
+      sample_size - number of duplicated keys shown on failure
+    
+    The exact duplicates report is persisted, so the count and the shown sample reuse one computation.
+    """
 
     columns_list = SparkDFUnitTests.__make_needed_cols(self.df, cols)
     
+    if approximate:
+      approx = self.df.agg(
+        count("*").alias("rows"),
+        approx_count_distinct(struct(*columns_list), rsd).alias("approx_keys"),
+      ).first()
+      print(f'Approximate check: {approx["approx_keys"]} distinct keys for {approx["rows"]} rows.')
+      if approx["approx_keys"] >= approx["rows"] * (1 - 3 * rsd):
+        print ("Test passed. Everything OK")
+        return 1
+      print("Approximate check indicates duplicates, running the exact check.")
+    
     dup_df = self.df.groupBy(columns_list).agg((count("*")).alias("frequency"))  #counting rows before and after dropping duplicates by primary key
-    dup_df_all = dup_df[dup_df['frequency']>1]
+    dup_df_all = dup_df[dup_df['frequency']>1].persist()
     dup_counter = dup_df_all.count()
 
     if dup_counter != 0:
-      dup_df[dup_df['frequency']>1].show()
+      dup_df_all.show(sample_size)
       print(dup_counter)
       print ("Test failed.")
       test_duplicates = 0
     else:
       test_duplicates = 1
       print ("Test passed. Everything OK")
+    dup_df_all.unpersist()
     return test_duplicates
   
   
@@ -127,7 +180,89 @@ class SparkDFUnitTests:
     return indicator_spaces
   
   
-  def missing_values(self, cols_left, df_right, cols_right):
+  def nulls_and_spaces_test(self, cols, check_nulls=True, check_spaces=True):
+    """
+    Fused mode of nulls_test and spaces_in_data: every counter for every column is computed in a single aggregation,
+    so the dataframe is scanned by one Spark job instead of one job per column and check.
+    
+    Counters per column:
+      nulls - rows with null value
+      leading_spaces - rows starting with a space
+      trailing_spaces - rows ending with a space
+      inner_spaces - rows with a space inside the trimmed value
+    
+    Result returned by method: (indicator, results)
+      indicator - 1 if every column passed every requested check, else 0
+      results - {column: {counter: value, ..., 'nulls_test': 1 or 0, 'spaces_test': 1 or 0}}
+    """
+    
+    columns_list = SparkDFUnitTests.__make_needed_cols(self.df, cols)
+    
+    d_counters = {}
+    for ix, cl in enumerate(columns_list):
+      c = col(cl)
+      s = c.cast('string')
+      if check_nulls:
+        d_counters[(cl, 'nulls')] = count(when(c.isNull(), 1)).alias(f'c{ix}_nulls')
+      if check_spaces:
+        d_counters[(cl, 'leading_spaces')] = count(when(s.startswith(' '), 1)).alias(f'c{ix}_leading')
+        d_counters[(cl, 'trailing_spaces')] = count(when(s.endswith(' '), 1)).alias(f'c{ix}_trailing')
+        d_counters[(cl, 'inner_spaces')] = count(when(trim(s).contains(' '), 1)).alias(f'c{ix}_inner')
+    
+    if not d_counters:
+      raise ValueError('[At least one of check_nulls or check_spaces must be True.]')
+    
+    row = self.df.agg(*d_counters.values()).first()
+    
+    results = {cl: {} for cl in columns_list}
+    for (cl, counter), value in zip(d_counters.keys(), row):
+      results[cl][counter] = value
+    
+    indicator = 1
+    for cl, counters in results.items():
+      if check_nulls:
+        counters['nulls_test'] = 0 if counters['nulls'] > 0 else 1
+        if counters['nulls'] > 0:
+          print(f'There are {str(counters["nulls"])} Null values in {cl} column.')
+      if check_spaces:
+        spaces = [counters['leading_spaces'], counters['trailing_spaces'], counters['inner_spaces']]
+        counters['spaces_test'] = 0 if max(spaces) > 0 else 1
+        for counter, where in zip(spaces, ['in begin of row', 'in end of row', 'inside of row']):
+          if counter > 0:
+            print(f'There are {str(counter)} rows with spaces {where} in {cl} column.')
+      if counters.get('nulls_test') == 0 or counters.get('spaces_test') == 0:
+        indicator = 0
+    
+    if indicator == 0:
+      print('Test for nulls and spaces failed')
+    else:
+      print('Test for nulls and spaces passed')
+    return indicator, results
+  
+  
+  def missing_values(self, cols_left, df_right, cols_right, sample_size=20, approx_precheck=False, rsd=0.05, return_details=False):
+    """
+    Matches the columns of the two dataframes and looks for lost distinct values in both directions.
+    Everything runs distributed: distinct values are compared with null-safe left anti-joins,
+    only the counts and a sample of at most sample_size missing values per side reach the driver.
+    
+    Args:
+      cols_left - columns of the main (left) dataframe, ix or names
+      df_right - dataframe to which we are comparing
+      cols_right - columns of the right dataframe, ix or names, matched with cols_left by position;
+        columns of different types are compared after a cast of both to a common type (wider numeric type,
+        timestamp for date vs timestamp, string for string vs other simple types), ValueError if there is none
+      sample_size - max number of missing values shown per column and side
+      approx_precheck - compare approx_count_distinct of all columns first (one job per dataframe);
+        a column whose approximate distinct counts differ by more than the estimation error (2 * rsd)
+        fails right away, without the exact anti-joins
+      rsd - maximum relative standard deviation for approx_count_distinct
+      return_details - return (indicator, results) instead of the indicator only
+    
+    Result returned by method: 1 or 0, with return_details also
+      results - {left column: {'right_column', 'missing_in_left', 'missing_in_right',
+                 'sample_missing_in_left', 'sample_missing_in_right', 'approx_failed'}}
+    """
     
     columns_list_left = SparkDFUnitTests.__make_needed_cols(self.df, cols_left)
     columns_list_right = SparkDFUnitTests.__make_needed_cols(df_right, cols_right)
@@ -135,22 +270,61 @@ class SparkDFUnitTests:
       raise ValueError('[The number of columns in the left dataframe does not correspond to the number of columns in the right dataframe. It must be the same.]')
     count_missing = 0
     print(columns_list_left)
+    
+    # both sides are cast to a common type: approx_count_distinct hashes and join keys depend on the type,
+    # so e.g. int vs bigint keys would otherwise not match, and casting to the narrower side would drop values
+    left_types = [field.dataType for field in self.df.select(*[col(cl) for cl in columns_list_left]).schema.fields]
+    right_types = [field.dataType for field in df_right.select(*[col(cl) for cl in columns_list_right]).schema.fields]
+    common_types = [SparkDFUnitTests.__common_type(l, r) for l, r in zip(left_types, right_types)]
+    left_values_cols = [col(cl).cast(common_types[ix]) for ix, cl in enumerate(columns_list_left)]
+    right_values_cols = [col(cl).cast(common_types[ix]) for ix, cl in enumerate(columns_list_right)]
+    
+    approx_failed = set()
+    if approx_precheck:
+      approx_left = self.df.agg(*[approx_count_distinct(cl, rsd).alias(f'c{ix}') for ix, cl in enumerate(left_values_cols)]).first()
+      approx_right = df_right.agg(*[approx_count_distinct(cl, rsd).alias(f'c{ix}') for ix, cl in enumerate(right_values_cols)]).first()
+      for ix, (l, r) in enumerate(zip(approx_left, approx_right)):
+        if abs(l - r) > 2 * rsd * max(l, r):
+          approx_failed.add(ix)
+    
+    results = {}
     for i in range(len(columns_list_left)):
-      left_df = set([_[0] for _ in self.df.select(columns_list_left[i]).collect()])
-      right_df = set([_[0] for _ in df_right.select(columns_list_right[i]).collect()])
+      cl_left, cl_right = columns_list_left[i], columns_list_right[i]
+      result = {
+        'right_column': cl_right,
+        'missing_in_left': None,
+        'missing_in_right': None,
+        'sample_missing_in_left': [],
+        'sample_missing_in_right': [],
+        'approx_failed': i in approx_failed,
+      }
+      results[cl_left] = result
       
-      l = len(left_df)
-      r = len(right_df)
-      if r > l:
-        diff = right_df - left_df
-        count_missing += 1
-        df_right.select(columns_list_right[i]).distinct().where(col(columns_list_right[i]).isin(diff)).display()
-        print(f'There are {str(len(diff))} missing distinct values  in {columns_list_left[i]} column compared to the right. There are more distinct values in the right dataframe.')
-      if l > r:
-        diff = left_df - right_df
+      if i in approx_failed:
         count_missing += 1
-        self.df.select(columns_list_left[i]).distinct().where(col(columns_list_left[i]).isin(diff)).display()
-        print(f'There are {str(len(diff))} missing distinct values  in {columns_list_right[i]} column compared to the left. There are more distinct values in the left dataframe.')
+        print(f'Approximate distinct counts of {cl_left} column and {cl_right} column differ, exact comparison skipped.')
+        continue
+      
+      left_values = self.df.select(left_values_cols[i].alias('value')).distinct().alias('l')
+      right_values = df_right.select(right_values_cols[i].alias('value')).distinct().alias('r')
+      
+      for side, missing_df in (
+        ('left', right_values.join(left_values, col('r.value').eqNullSafe(col('l.value')), 'left_anti')),
+        ('right', left_values.join(right_values, col('l.value').eqNullSafe(col('r.value')), 'left_anti')),
+      ):
+        missing_df = missing_df.persist()
+        n_missing = missing_df.count()
+        result[f'missing_in_{side}'] = n_missing
+        if n_missing > 0:
+          result[f'sample_missing_in_{side}'] = [_[0] for _ in missing_df.limit(sample_size).collect()]
+        missing_df.unpersist()
+        
+        if n_missing > 0:
+          count_missing += 1
+          if side == 'left':
+            print(f'There are {str(n_missing)} missing distinct values  in {cl_left} column compared to the right. Sample: {result["sample_missing_in_left"]}')
+          else:
+            print(f'There are {str(n_missing)} missing distinct values  in {cl_right} column compared to the left. Sample: {result["sample_missing_in_right"]}')
         
     if count_missing != 0:
       indicator_missing = 0
@@ -158,6 +332,8 @@ class SparkDFUnitTests:
     else:
       indicator_missing = 1
       print('Test for missing values passed')
+    if return_details:
+      return indicator_missing, results
     return indicator_missing
       
   def empty_df(self):
@@ -175,10 +351,374 @@ class SparkDFUnitTests:
 
 # COMMAND ----------
 
+# SparkDFTestRunner lives in ee_srlib.spark_df_unit_test, this notebook only plugs its own SparkDFUnitTests into it.
+# The installed wheel is used when present, otherwise the module is loaded from ee_sr_libraries.zip next to this notebook.
+try:
+  from ee_srlib.spark_df_unit_test.spark_df_unit_test import SparkDFTestRunner as _PackagedSparkDFTestRunner
+except ImportError:
+  import os
+  import types
+  import zipfile
+  _runner_member = "ee_sr_libraries/ee_srlib/spark_df_unit_test/spark_df_unit_test.py"
+  with zipfile.ZipFile(os.path.join(os.getcwd(), "ee_sr_libraries.zip")) as _package_zip:
+    _runner_module = types.ModuleType("ee_srlib_spark_df_unit_test")
+    exec(compile(_package_zip.read(_runner_member).decode("utf-8"), _runner_member, "exec"), _runner_module.__dict__)
+  _PackagedSparkDFTestRunner = _runner_module.SparkDFTestRunner
+
+
+class SparkDFTestRunner(_PackagedSparkDFTestRunner):
+  
+  """
+  ee_srlib SparkDFTestRunner running the checks of this notebook SparkDFUnitTests (approximate duplicates,
+  nulls_and_spaces_test etc.). See the packaged class for the check description and the result table.
+  """
+  
+  def __init__(self, df, checks, max_workers=4, storage_level=StorageLevel.MEMORY_AND_DISK):
+    super().__init__(df, checks, max_workers, storage_level, tests_class=SparkDFUnitTests)
+
+# COMMAND ----------
+
+class IncrementalSparkDFUnitTests:
+  
+  """
+  This class validates only the rows changed in a table since the last validated run.
+  
+  New rows are selected by one of:
+    watermark_col - rows with watermark_col greater than the watermark saved by the last commit.
+      The table is expected to be append only: a row updated with a new watermark counts as one more row.
+    Delta version diff (watermark_col=None) - changes between the last committed table version and the current one,
+      read from the change data feed (delta.enableChangeDataFeed must be on). Inserts and update postimages are
+      the new rows, update preimages and deletes are subtracted from the saved metrics and key counts.
+  The first run, without saved state, validates the whole table.
+  
+  Everything is kept in state_table, written by one MERGE on commit, so a failed commit leaves no partial state:
+    run rows - watermark and table version of every committed run
+    metric rows - net change of rows, nulls, leading/trailing/inner spaces per partition (partition_cols) and column
+    key rows (metric 'key') - one compacted row per key hash (xxhash64 of the key) with its current row count,
+      so duplicates_test compares the new keys with earlier runs without reading the table or the run history
+  
+  Description of methods:
+    new_data - new rows to validate, persisted until commit
+    empty_df, nulls_test, spaces_in_data, duplicates_test - checks of the new rows, like in SparkDFUnitTests
+    commit - saves the watermark / version, the metrics and the key counts of this run
+    partition_state - accumulated metrics per partition and column
+  
+  Result returned by checks: 1 or 0 + Description of problem if 0
+  
+  """
+  
+  run_partition = '__run__'
+  all_partitions = '__all__'
+  key_metric = 'key'
+  
+  state_schema = StructType([
+    StructField('table_name', StringType()),
+    StructField('partition', StringType()),
+    StructField('column', StringType()),
+    StructField('metric', StringType()),
+    StructField('value', LongType()),
+    StructField('watermark', StringType()),
+    StructField('version', LongType()),
+    StructField('key_hash', LongType()),
+  ])
+  
+  def __init__(self, spark, table_name, state_table, watermark_col=None, partition_cols=None):
+    self.spark = spark
+    self.table_name = table_name
+    self.state_table = state_table
+    self.watermark_col = watermark_col
+    self.partition_cols = partition_cols or []
+    self.__changes = None
+    self.__new_data = None
+    self.__new_watermark = None
+    self.__new_version = None
+    self.__metrics = {}
+    self.__key_counts = {}
+    
+  def __repr__(self):
+    return f'This class validates the rows added to {self.table_name} since the last run.'
+  
+  def __last_run(self):
+    
+    if not self.spark.catalog.tableExists(self.state_table):
+      return None
+    return (
+      self.spark.table(self.state_table)
+      .where((col('table_name') == self.table_name) & (col('partition') == self.run_partition))
+      .orderBy(col('updated_at').desc())
+      .first()
+    )
+  
+  def __partition(self):
+    
+    if not self.partition_cols:
+      return lit(self.all_partitions)
+    return concat_ws('/', *[col(cl).cast('string') for cl in self.partition_cols])
+  
+  def __make_needed_cols(self, cols):
+    
+    if SparkDFUnitTests.type_chek(cols):
+      columns = self.new_data().columns
+      return [columns[ix] if 0 <= ix < len(columns) else None for ix in cols]
+    return cols
+  
+  def __load_changes(self):
+    """
+    Changed rows with _partition and _sign: 1 for a new row image, -1 for a removed one (update preimage, delete).
+    """
+    
+    if self.__changes is not None:
+      return self.__changes
+    
+    last_run = self.__last_run()
+    df = self.spark.table(self.table_name)
+    sign = lit(1)
+    
+    if self.watermark_col is not None:
+      if last_run is not None and last_run['watermark'] is not None:
+        watermark_type = df.schema[self.watermark_col].dataType
+        df = df.where(col(self.watermark_col) > lit(last_run['watermark']).cast(watermark_type))
+    else:
+      self.__new_version = self.spark.sql(f'DESCRIBE HISTORY {self.table_name} LIMIT 1').first()['version']
+      if last_run is None or last_run['version'] is None:
+        df = self.spark.read.option('versionAsOf', self.__new_version).table(self.table_name)
+      elif last_run['version'] >= self.__new_version:
+        df = df.limit(0)
+      else:
+        df = (
+          self.spark.read.format('delta')
+          .option('readChangeFeed', 'true')
+          .option('startingVersion', last_run['version'] + 1)
+          .option('endingVersion', self.__new_version)
+          .table(self.table_name)
+        )
+        sign = when(col('_change_type').isin('insert', 'update_postimage'), 1).otherwise(-1)
+        df = df.withColumn('_sign', sign).drop('_change_type', '_commit_version', '_commit_timestamp')
+        sign = col('_sign')
+    
+    self.__changes = (
+      df.withColumn('_partition', self.__partition()).withColumn('_sign', sign)
+      .persist(StorageLevel.MEMORY_AND_DISK)
+    )
+    
+    if self.watermark_col is not None:
+      self.__new_watermark = self.__changes.agg(spark_max(self.watermark_col)).first()[0]
+      if self.__new_watermark is None and last_run is not None:
+        self.__new_watermark = last_run['watermark']
+    
+    return self.__changes
+  
+  def new_data(self):
+    
+    if self.__new_data is None:
+      self.__new_data = self.__load_changes().where(col('_sign') > 0).drop('_sign')
+    return self.__new_data
+  
+  def __partition_counters(self, conditions):
+    """
+    One pass over the changes: counts of new rows matching every condition for the check result,
+    and the net change per partition (new minus removed rows) for the saved metrics.
+    """
+    
+    df = self.__load_changes()
+    sign = col('_sign')
+    aggs = [spark_sum(sign).alias('rows')]
+    for ix, condition in enumerate(conditions.values()):
+      aggs.append(count(when(condition & (sign > 0), 1)).alias(f'c{ix}_new'))
+      aggs.append(spark_sum(when(condition, sign).otherwise(0)).alias(f'c{ix}_net'))
+    rows = df.groupBy('_partition').agg(*aggs).collect()
+    
+    results = {}
+    for row in rows:
+      partition = row['_partition']
+      self.__metrics[(partition, None, 'rows')] = row['rows']
+      for ix, (cl, metric) in enumerate(conditions.keys()):
+        self.__metrics[(partition, cl, metric)] = row[f'c{ix}_net']
+        results[(cl, metric)] = results.get((cl, metric), 0) + row[f'c{ix}_new']
+    return results
+  
+  def empty_df(self):
+    
+    count_rows = self.new_data().count()
+    
+    if count_rows > 0:
+      indicator_empty = 1
+      print(f'There are {str(count_rows)} new rows, everything OK.')
+    else:
+      indicator_empty = 0
+      print('There are no new rows, please check.')
+      
+    return indicator_empty, count_rows
+  
+  def nulls_test(self, cols):
+    
+    columns_list = self.__make_needed_cols(cols)
+    results = self.__partition_counters({(cl, 'nulls'): col(cl).isNull() for cl in columns_list})
+    
+    count_nulls = 0
+    for cl in columns_list:
+      test_nulls = results.get((cl, 'nulls'), 0)
+      if test_nulls != 0:
+        count_nulls += 1
+        print(f'There are {str(test_nulls)} Null values in {cl} column.')
+        
+    if count_nulls != 0:
+      indicator_nulls = 0
+      print('Test for nulls failed')
+    else:
+      indicator_nulls = 1
+      print('Test for nulls passed')
+    return indicator_nulls
+  
+  def spaces_in_data(self, cols):
+    
+    columns_list = self.__make_needed_cols(cols)
+    conditions = {}
+    for cl in columns_list:
+      s = col(cl).cast('string')
+      conditions[(cl, 'leading_spaces')] = s.startswith(' ')
+      conditions[(cl, 'trailing_spaces')] = s.endswith(' ')
+      conditions[(cl, 'inner_spaces')] = trim(s).contains(' ')
+    results = self.__partition_counters(conditions)
+    
+    count_spaces = 0
+    for cl in columns_list:
+      for metric, where in zip(['leading_spaces', 'trailing_spaces', 'inner_spaces'], ['in begin of row', 'in end of row', 'inside of row']):
+        counter = results.get((cl, metric), 0)
+        if counter > 0:
+          count_spaces += 1
+          print(f'There are {str(counter)} rows with spaces {where} in {cl} column.')
+          
+    if count_spaces != 0:
+      indicator_spaces = 0
+      print('Test for spaces failed')
+    else:
+      indicator_spaces = 1
+      print('Test for spaces passed')
+    return indicator_spaces
+  
+  def duplicates_test(self, cols, sample_size=20):
+    """
+    Looks for keys with more than one current row: the net change of the key in this run (new minus removed rows,
+    so an updated or inserted-then-updated row counts once) plus its count saved by earlier runs.
+    Earlier keys are compared by their xxhash64 against the compacted key rows of state_table, not the table.
+    """
+    
+    columns_list = self.__make_needed_cols(cols)
+    key_cols = ','.join(columns_list)
+    
+    keys = (
+      self.__load_changes()
+      .groupBy(*columns_list)
+      .agg(spark_sum('_sign').alias('new_rows'), spark_max(when(col('_sign') > 0, col('_partition'))).alias('_partition'))
+      .withColumn('key_hash', xxhash64(*columns_list))
+      .persist(StorageLevel.MEMORY_AND_DISK)
+    )
+    if key_cols in self.__key_counts:
+      self.__key_counts[key_cols].unpersist()
+    self.__key_counts[key_cols] = keys
+    
+    if self.spark.catalog.tableExists(self.state_table):
+      old_keys = (
+        self.spark.table(self.state_table)
+        .where((col('table_name') == self.table_name) & (col('metric') == self.key_metric) & (col('column') == key_cols))
+        .select('key_hash', col('value').alias('existing_rows'), col('partition').alias('existing_partition'))
+      )
+      keys = keys.join(old_keys, 'key_hash', 'left')
+    else:
+      keys = keys.withColumn('existing_rows', lit(None).cast('long')).withColumn('existing_partition', lit(None).cast('string'))
+    
+    duplicated = (
+      keys.withColumn('existing_rows', coalesce(col('existing_rows'), lit(0)))
+      .withColumn('rows', col('new_rows') + col('existing_rows'))
+      .where(col('rows') > 1)
+      .persist()
+    )
+    counters = duplicated.agg(
+      count('*').alias('keys'),
+      count(when(col('existing_rows') > 0, 1)).alias('earlier_keys'),
+    ).first()
+    
+    if counters['keys'] != 0:
+      duplicated.select(*columns_list, 'rows', '_partition', 'existing_partition').show(sample_size)
+      print(f"There are {str(counters['keys'] - counters['earlier_keys'])} duplicated keys in the new rows.")
+      print(f"There are {str(counters['earlier_keys'])} new keys from earlier partitions.")
+      print ("Test failed.")
+      test_duplicates = 0
+    else:
+      test_duplicates = 1
+      print("Test passed. Everything OK")
+    duplicated.unpersist()
+    
+    return test_duplicates
+  
+  def commit(self):
+    """
+    Merges the metrics, the key counts and the watermark / version of this run into state_table in one MERGE,
+    so either all of them or none are saved, and releases the persisted rows.
+    The next run starts after this watermark / version.
+    """
+    
+    self.__load_changes()
+    metrics = [(self.table_name, *key, value, None, None, None) for key, value in self.__metrics.items()] + [
+      (self.table_name, self.run_partition, None, 'run', None,
+       None if self.__new_watermark is None else str(self.__new_watermark), self.__new_version, None)
+    ]
+    updates = self.spark.createDataFrame(metrics, self.state_schema)
+    for key_cols, keys in self.__key_counts.items():
+      updates = updates.unionByName(
+        keys.groupBy('key_hash').agg(spark_sum('new_rows').alias('value'), spark_max('_partition').alias('partition'))
+        .select(
+          lit(self.table_name).alias('table_name'), 'partition', lit(key_cols).alias('column'),
+          lit(self.key_metric).alias('metric'), 'value', lit(None).cast('string').alias('watermark'),
+          lit(None).cast('long').alias('version'), 'key_hash',
+        )
+      )
+    updates = updates.withColumn('updated_at', current_timestamp())
+    
+    if not self.spark.catalog.tableExists(self.state_table):
+      updates.limit(0).write.format('delta').partitionBy('table_name', 'metric').saveAsTable(self.state_table)
+    
+    view = f'dq_state_updates_{uuid.uuid4().hex}'
+    updates.createOrReplaceTempView(view)
+    try:
+      self.spark.sql(f"""
+        MERGE INTO {self.state_table} t
+        USING {view} s
+        ON t.table_name = s.table_name AND t.metric = '{self.key_metric}' AND s.metric = '{self.key_metric}'
+          AND t.`column` = s.`column` AND t.key_hash = s.key_hash
+        WHEN MATCHED AND t.value + s.value <= 0 THEN DELETE
+        WHEN MATCHED THEN UPDATE SET t.value = t.value + s.value, t.partition = coalesce(s.partition, t.partition), t.updated_at = s.updated_at
+        WHEN NOT MATCHED AND (s.metric != '{self.key_metric}' OR s.value > 0) THEN INSERT *
+      """)
+    finally:
+      self.spark.catalog.dropTempView(view)
+    
+    for keys in self.__key_counts.values():
+      keys.unpersist()
+    self.__changes.unpersist()
+    self.__changes = None
+    self.__new_data = None
+    self.__metrics = {}
+    self.__key_counts = {}
+    print(f'Committed {self.table_name} at watermark {self.__new_watermark}, version {self.__new_version}')
+    
+  def partition_state(self):
+    
+    return (
+      self.spark.table(self.state_table)
+      .where((col('table_name') == self.table_name) & (col('partition') != self.run_partition) & (col('metric') != self.key_metric))
+      .groupBy('partition', 'column', 'metric')
+      .agg(spark_sum('value').alias('value'))
+    )
+
+# COMMAND ----------
+
 ############ duplicates_test use example ############
 # cols = [1,3,4] .... # List with cols ix, like [0,3,5], which are the key in the aggregate. In this test it will be primary key for duplicates_test
 # t = SparkDFUnitTests(df_visits) # Making class object 
 # test = t.duplicates_test(cols) # test results
+# test = t.duplicates_test(cols, approximate=True) # approx_count_distinct first, passes on the estimate, exact grouped report only if it indicates duplicates
 ############ duplicates_test use example ############
 
 # COMMAND ----------
@@ -199,6 +739,14 @@ class SparkDFUnitTests:
 
 # COMMAND ----------
 
+############ nulls_and_spaces_test use example ############
+# cols = [1,3,4] .... # List with cols ix, like [0,3,5]. All counters for all columns are computed in one Spark job.
+# t = SparkDFUnitTests(df_visits) # Making class object 
+# indicator, results = t.nulls_and_spaces_test(cols) # 1 or 0 and per-column counters, like results['col_name']['nulls']
+############ nulls_and_spaces_test use example ############
+
+# COMMAND ----------
+
 ############ missing_values use example ############
 # cols = [1,3,4] .... # List with cols ix, like [0,3,5], which are the key for main df (left). In this test, the matching will take place on a column-by-column basis. The number of columns submitted for comparison must be the same.
 # cols_r = [2,5,6] .... # List with cols ix, like [0,3,5], which are the key for right df. In this test, the matching will take place on a column-by-column basis. The number of columns submitted for comparison must be the same.
@@ -208,7 +756,38 @@ class SparkDFUnitTests:
 #                         df_right = df_r   -  Dataframe to which we are comparing
 #                         cols_right = cols_r
 #                         ) 
+# test, details = t.missing_values(cols, df_r, cols_r, sample_size=10, approx_precheck=True, return_details=True) # counts and samples per column
 ############ missing_values use example ############
 
 # COMMAND ----------
 
+############ SparkDFTestRunner use example ############
+# checks = [
+#   {'test': 'duplicates_test', 'cols': [0, 1], 'approximate': True},
+#   {'test': 'nulls_and_spaces_test', 'cols': [2, 3]},
+#   {'test': 'missing_values', 'name': 'visits vs orders', 'cols_left': [0], 'df_right': df_r, 'cols_right': [2]},
+#   {'test': 'empty_df'},
+# ]
+# runner = SparkDFTestRunner(df_visits, checks, max_workers=4) # Making class object 
+# indicator, result_df = runner.run() # 1 or 0 and one row per check with wall time, runner.source_rows - rows of the source
+# result_df.display()
+############ SparkDFTestRunner use example ############
+
+# COMMAND ----------
+
+############ IncrementalSparkDFUnitTests use example ############
+# t = IncrementalSparkDFUnitTests(
+#   spark, 'sales.fact_visits', state_table='dq.validation_state',
+#   watermark_col='load_ts', # or None to read the Delta change data feed since the last committed version
+#   partition_cols=['load_date'],
+# )
+# t.empty_df() # new rows only
+# t.nulls_test([1, 3])
+# t.spaces_in_data([2])
+# t.duplicates_test([0]) # inside the changed rows and against keys of earlier runs
+# t.commit() # one MERGE of watermark / version, per-partition metrics and key counts
+# t.partition_state().display()
+############ IncrementalSparkDFUnitTests use example ############
+
+# COMMAND ----------
+
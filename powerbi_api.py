@@ -16,26 +16,17 @@
 
 # COMMAND ----------
 
-from azure.identity import ClientSecretCredential
-import requests
-import io
-import json
-import ast
+# MAGIC %run ./powerbi_client
 
 # COMMAND ----------
 
-### EE PBI API Service principal attributes
-
-tenant_id = '3596192b-fdf5-4e2c-a6fa-acb706c963d8'
-client_id = 'ab68979e-6b50-424c-8488-96ad83da5282'
-client_secret = dbutils.secrets.get(scope = "lp14dv", key = "powerbi-api-client-secret")
+import ast
 
 # COMMAND ----------
 
-# get authentication token
+# EE PBI API Service principal client, it caches the authentication token and reuses connections, 429/5xx responses are retried
 
-auth_class = ClientSecretCredential(tenant_id = tenant_id, client_id = client_id, client_secret = client_secret)
-token = auth_class.get_token("https://analysis.windows.net/powerbi/api/.default").token
+client = PowerBIClient.from_secret_scope(dbutils)
 
 # COMMAND ----------
 
@@ -65,29 +56,11 @@ refresh_mode = dbutils.widgets.get('refresh_mode')
 
 # COMMAND ----------
 
-def check_tables_list(lst):
-  """
-  Help function to check if tables parameter is blank
-  """
-  return not (len(lst) == 1 and lst[0] == "")
-
-# COMMAND ----------
-
-### do not change Authorization key in header
-
-header_auth = {'Authorization': f'Bearer {token}'}
-
-# COMMAND ----------
-
-# convert string headers and body to dict
+# convert string headers and body to dict, Authorization header is added by the client
 
 headers = ast.literal_eval(headers)
 body = ast.literal_eval(body)
 
-# concatenate auth and other headers
-
-headers = {**header_auth, **headers}
-
 # COMMAND ----------
 
 ### replace placeholders with actual values
@@ -100,31 +73,7 @@ api_uri = api_uri.format(groupId = groupId, datasetId=datasetId, reportId=report
 
 def refresh_pbi(groupId = groupId, datasetId = datasetId, tables = tables, refresh_mode=refresh_mode, **kwargs):
   
-  uri = 'https://api.powerbi.com/v1.0/myorg/groups/{groupId}/datasets/{datasetId}/refreshes'.format(groupId=groupId, datasetId=datasetId)
-  
-  if refresh_mode == 'enhanced':
-
-    body_func = {'retryCount': 2, 'type': 'Full'}
-    body_func = {**body, **body_func}
-
-    if check_tables_list(tables):
-      init_list = []
-  
-      for table in tables:
-        init_list += [{'table': table}]
-
-      body_tables = {'objects': init_list}
-      body_func = {**body_func, **body_tables}
-
-  elif refresh_mode == 'regular':
-    body_func = {}
-  
-  else:
-    raise ValueError('refresh_mode can be either enhanced or regular')
-  
-  response = requests.post(uri, headers=headers, json=body_func)
-    
-  return response
+  return client.refresh_pbi(groupId, datasetId, tables=tables, refresh_mode=refresh_mode, body=body, headers=headers)
 
 # COMMAND ----------
 
@@ -132,30 +81,16 @@ def refresh_pbi(groupId = groupId, datasetId = datasetId, tables = tables, refre
 
 def cancel_pbi_refresh(groupId = groupId, datasetId = datasetId, **kwargs):
   
-  get_uri = 'https://api.powerbi.com/v1.0/myorg/groups/{groupId}/datasets/{datasetId}/refreshes'.format(groupId=groupId, datasetId=datasetId)
-
-  get_response = requests.get(get_uri, headers=headers, json=body).json()
-
-  get_response_in_progress = []
-    
-  for i in [x for x in get_response['value'] if x['status'] == 'Unknown']: 
-    get_response_in_progress.append(i['requestId'])
-      
-  for i in get_response_in_progress:
-
-    uri = 'https://api.powerbi.com/v1.0/myorg/groups/{groupId}/datasets/{datasetId}/refreshes/{refreshId}'.format(groupId=groupId, datasetId=datasetId, refreshId=i)
-    response = requests.delete(uri, headers=headers, json=body)
-    
-  return response
+  return client.cancel_pbi_refresh(groupId, datasetId, body=body, headers=headers)
 
 # COMMAND ----------
 
 ### takes method from widgets and assigns valid function
 
 switcher = {
-  'get': requests.get,
-  'post': requests.post,
-  'delete': requests.delete,
+  'get': client.get,
+  'post': client.post,
+  'delete': client.delete,
   'refresh_pbi': refresh_pbi,
   'cancel_pbi_refresh': cancel_pbi_refresh
 }
@@ -172,6 +107,14 @@ else:
 
 # COMMAND ----------
 
+### cancellation returns one result per cancelled refresh
+
+if api_method.lower() == 'cancel_pbi_refresh':
+  
+  dbutils.notebook.exit({'value': response})
+
+# COMMAND ----------
+
 ### reponse can passed on to other notebooks
 
 try: 
@@ -0,0 +1,409 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC Reusable Power BI REST API client, used by the `powerbi_api` notebook and importable from other notebooks and jobs.
+# MAGIC
+# MAGIC - AAD tokens are cached per service principal until shortly before they expire, for every client in the process
+# MAGIC   (in memory only, every job or notebook process requests its own token)
+# MAGIC - requests go through one keep-alive `requests.Session` with a connection pool
+# MAGIC - GET / DELETE requests answered with 429 or 5xx are retried with exponential backoff, honouring the `Retry-After` header.
+# MAGIC   POST requests (refresh) are retried only on 429 and connection errors, when the service has not accepted them
+# MAGIC - a 401 response drops the cached token and retries once with a new one
+# MAGIC
+# MAGIC `PowerBIRefreshOrchestrator` refreshes many datasets with bounded concurrency and adaptive polling:
+# MAGIC
+# MAGIC `PowerBIRefreshOrchestrator(PowerBIClient.from_secret_scope(dbutils)).run([{'groupId': ..., 'datasetId': ..., 'tables': ['Sales']}, ...])`
+# MAGIC
+# MAGIC Requirements:
+# MAGIC - azure-identity package
+# MAGIC
+# MAGIC Link to MS API documentation: https://docs.microsoft.com/en-us/rest/api/power-bi
+
+# COMMAND ----------
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# COMMAND ----------
+
+### EE PBI API Service principal attributes
+
+EE_PBI_TENANT_ID = '3596192b-fdf5-4e2c-a6fa-acb706c963d8'
+EE_PBI_CLIENT_ID = 'ab68979e-6b50-424c-8488-96ad83da5282'
+EE_PBI_SECRET_SCOPE = 'lp14dv'
+EE_PBI_SECRET_KEY = 'powerbi-api-client-secret'
+
+# COMMAND ----------
+
+class PowerBIRetry(Retry):
+  """
+  urllib3 Retry that also retries non-idempotent methods (POST), but only on 429: the request was rejected
+  before it was processed, so sending it again does not start a second refresh. Connection errors are retried
+  for every method by urllib3 itself, read errors and 5xx only for the idempotent methods.
+  """
+
+  def is_retry(self, method, status_code, has_retry_after=False):
+    if status_code == 429 and not self._is_method_retryable(method):
+      return bool(self.total)
+    return super().is_retry(method, status_code, has_retry_after)
+
+# COMMAND ----------
+
+class PowerBIClient:
+  """
+  Power BI REST API client of one service principal.
+
+  Args:
+    tenant_id, client_id, client_secret - service principal attributes, used to build a ClientSecretCredential
+    credential - azure-identity credential to use instead of tenant_id / client_id / client_secret
+    max_retries - retries of a request answered with 429 or 5xx, or failed on connection (POST: 429 and connection only)
+    backoff_factor - base of the exponential backoff in seconds, used when there is no Retry-After header
+    timeout - (connect, read) timeout of every request in seconds
+    token_refresh_margin - seconds before expiry when a cached token is replaced
+    pool_maxsize - keep-alive connections kept per host
+
+  Methods:
+    get / post / delete / request - raw API calls with authorization, timeout and retries
+    refresh_pbi - triggers a dataset refresh (enhanced or regular)
+    cancel_pbi_refresh - cancels the refreshes of a dataset that are in progress, concurrently
+    refresh_history - incrementally synced refresh history of a dataset
+  """
+
+  api_url = 'https://api.powerbi.com/v1.0/myorg'
+  scope = 'https://analysis.windows.net/powerbi/api/.default'
+  retry_statuses = (429, 500, 502, 503, 504)
+
+  _tokens = {}
+  _tokens_lock = threading.Lock()
+
+  def __init__(self, tenant_id=None, client_id=None, client_secret=None, credential=None, max_retries=5,
+               backoff_factor=1.0, timeout=(10, 120), token_refresh_margin=300, pool_maxsize=10):
+    if credential is None:
+      from azure.identity import ClientSecretCredential
+      credential = ClientSecretCredential(tenant_id=tenant_id, client_id=client_id, client_secret=client_secret)
+    self.credential = credential
+    self.token_key = (tenant_id, client_id, self.scope) if client_id else (id(credential), self.scope)
+    self.timeout = timeout
+    self.token_refresh_margin = token_refresh_margin
+
+    retry = PowerBIRetry(
+      total=max_retries,
+      backoff_factor=backoff_factor,
+      status_forcelist=self.retry_statuses,
+      respect_retry_after_header=True,
+      raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=pool_maxsize)
+    self.session = requests.Session()
+    self.session.mount('https://', adapter)
+    self.session.mount('http://', adapter)
+    self._histories = {}
+    self._histories_lock = threading.Lock()
+
+  @classmethod
+  def from_secret_scope(cls, dbutils, scope=EE_PBI_SECRET_SCOPE, key=EE_PBI_SECRET_KEY,
+                        tenant_id=EE_PBI_TENANT_ID, client_id=EE_PBI_CLIENT_ID, **kwargs):
+    """
+    Client of the service principal whose secret is kept in a Databricks secret scope, EE PBI API Service principal by default.
+    """
+    return cls(tenant_id=tenant_id, client_id=client_id, client_secret=dbutils.secrets.get(scope=scope, key=key), **kwargs)
+
+  def __repr__(self):
+    return 'Power BI REST API client.'
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def close(self):
+    self.session.close()
+
+  def get_token(self, force_refresh=False):
+    """
+    Returns the cached access token, requesting a new one when there is none,
+    it expires within token_refresh_margin seconds or force_refresh is True.
+    """
+    with self._tokens_lock:
+      cached = self._tokens.get(self.token_key)
+      if force_refresh or cached is None or cached.expires_on - self.token_refresh_margin <= time.time():
+        cached = self.credential.get_token(self.scope)
+        self._tokens[self.token_key] = cached
+      return cached.token
+
+  def request(self, method, url, headers=None, json=None, **kwargs):
+    """
+    Sends a request to url (absolute, or relative to api_url) with the authorization header.
+    429 / 5xx responses are retried by the session (POST only on 429), a 401 is retried once with a new token.
+    """
+    if not url.startswith('http'):
+      url = f"{self.api_url}/{url.lstrip('/')}"
+    kwargs.setdefault('timeout', self.timeout)
+
+    response = None
+    for force_refresh in (False, True):
+      request_headers = {**(headers or {}), 'Authorization': f'Bearer {self.get_token(force_refresh)}'}
+      response = self.session.request(method, url, headers=request_headers, json=json, **kwargs)
+      if response.status_code != 401:
+        break
+    return response
+
+  def get(self, url, **kwargs):
+    return self.request('GET', url, **kwargs)
+
+  def post(self, url, **kwargs):
+    return self.request('POST', url, **kwargs)
+
+  def delete(self, url, **kwargs):
+    return self.request('DELETE', url, **kwargs)
+
+  def refreshes_uri(self, groupId, datasetId):
+    return f'{self.api_url}/groups/{groupId}/datasets/{datasetId}/refreshes'
+
+  def refresh_pbi(self, groupId, datasetId, tables=None, refresh_mode='enhanced', body=None, headers=None):
+    """
+    Triggers a refresh of the dataset. Enhanced refresh can be limited to a list of tables.
+    """
+    if refresh_mode == 'enhanced':
+      body_func = {**(body or {}), 'retryCount': 2, 'type': 'Full'}
+      tables = [table for table in (tables or []) if table]
+      if tables:
+        body_func['objects'] = [{'table': table} for table in tables]
+
+    elif refresh_mode == 'regular':
+      body_func = {}
+
+    else:
+      raise ValueError('refresh_mode can be either enhanced or regular')
+
+    return self.post(self.refreshes_uri(groupId, datasetId), headers=headers, json=body_func)
+
+  def refresh_history(self, groupId, datasetId):
+    """
+    Cached PowerBIRefreshHistory of the dataset, shared by all calls of this client.
+    """
+    with self._histories_lock:
+      key = (groupId, datasetId)
+      if key not in self._histories:
+        self._histories[key] = PowerBIRefreshHistory(self, groupId, datasetId)
+      return self._histories[key]
+
+  def cancel_pbi_refresh(self, groupId, datasetId, body=None, headers=None, max_workers=5):
+    """
+    Cancels the refreshes of the dataset that are in progress, found with an incremental refresh history sync.
+    The cancellations are sent concurrently.
+
+    Result returned by method: list with one dict per cancelled refresh: requestId, status_code, ok, text
+    """
+    history = self.refresh_history(groupId, datasetId)
+    history.sync()
+    in_progress = [entry['requestId'] for entry in history.in_progress()]
+
+    def cancel(refreshId):
+      try:
+        response = self.delete(f'{self.refreshes_uri(groupId, datasetId)}/{refreshId}', headers=headers, json=body)
+        return {'requestId': refreshId, 'status_code': response.status_code, 'ok': response.ok, 'text': response.text}
+      except requests.RequestException as e:
+        return {'requestId': refreshId, 'status_code': None, 'ok': False, 'text': f'{type(e).__name__}: {e}'}
+
+    if not in_progress:
+      return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(in_progress))) as pool:
+      return list(pool.map(cancel, in_progress))
+
+# COMMAND ----------
+
+class PowerBIRefreshHistory:
+  """
+  Local cache of the refresh history of one dataset, kept up to date with small $top requests.
+
+  sync() asks for the latest page_size entries and doubles $top only while the page holds nothing but new
+  entries, or misses a cached refresh that was still running. Finished entries do not change, so once the
+  page reaches a known finished refresh the older history is already cached. The first sync fetches one page.
+
+  Methods:
+    sync - updates the cache, returns the new entries and the entries whose status changed
+    get - cached entry of a requestId
+    latest - newest cached entry, optionally only among the entries started at or after a time
+    in_progress - cached entries that are still running
+  """
+
+  running_statuses = ('Unknown', 'NotStarted', 'InProgress')
+
+  def __init__(self, client, groupId, datasetId, page_size=10):
+    self.client = client
+    self.groupId = groupId
+    self.datasetId = datasetId
+    self.page_size = page_size
+    self.entries = {}
+    self.order = []
+    self.requests_sent = 0
+    self._lock = threading.Lock()
+
+  def __repr__(self):
+    return f'Refresh history of dataset {self.datasetId}: {len(self.order)} cached entries.'
+
+  def _fetch(self, top):
+    response = self.client.get(f'{self.client.refreshes_uri(self.groupId, self.datasetId)}?$top={top}')
+    response.raise_for_status()
+    self.requests_sent += 1
+    return response.json()['value']
+
+  def sync(self):
+    with self._lock:
+      running = {rid for rid, entry in self.entries.items() if entry.get('status') in self.running_statuses}
+      top = self.page_size
+      while True:
+        page = self._fetch(top)
+        page_ids = {entry.get('requestId') for entry in page}
+        reached_finished = any(
+          rid in self.entries and self.entries[rid].get('status') not in self.running_statuses for rid in page_ids
+        )
+        if not self.entries or len(page) < top or (reached_finished and running <= page_ids):
+          break
+        top *= 2
+
+      changed = []
+      for entry in page:
+        rid = entry.get('requestId')
+        if self.entries.get(rid) != entry:
+          changed.append(entry)
+        self.entries[rid] = entry
+      known = set(page_ids)
+      self.order = [entry.get('requestId') for entry in page] + [rid for rid in self.order if rid not in known]
+      return changed
+
+  def get(self, requestId):
+    return self.entries.get(requestId)
+
+  def latest(self, started_after=None):
+    for rid in self.order:
+      entry = self.entries[rid]
+      if started_after is None or (entry.get('startTime') and pd.Timestamp(entry['startTime']) >= started_after):
+        return entry
+    return None
+
+  def in_progress(self):
+    return [self.entries[rid] for rid in self.order if self.entries[rid].get('status') in self.running_statuses]
+
+# COMMAND ----------
+
+class PowerBIRefreshOrchestrator:
+  """
+  Refreshes many Power BI datasets at once and waits for all of them.
+
+  Up to max_concurrency refreshes are triggered and watched at the same time. The refresh history of every
+  dataset is polled with an adaptive interval: poll_interval after the trigger, growing by poll_backoff
+  after every poll that finds the refresh still running, up to max_poll_interval.
+
+  The refresh is looked up by the id returned by the trigger. The id is not guaranteed to match the history
+  requestId (regular refresh), so after request_id_polls polls without a match the newest refresh started
+  at or after the trigger is followed instead.
+
+  Args:
+    client - PowerBIClient
+    max_concurrency - datasets refreshed at the same time
+    poll_interval, poll_backoff, max_poll_interval - polling schedule in seconds
+    timeout - seconds to wait for one refresh before it is reported as TimedOut
+    request_id_polls - polls without the triggered id in the history before the newest refresh started after the trigger is used
+
+  Dataset description - dict with groupId, datasetId and optional tables (list), refresh_mode ('enhanced' by default), body
+
+  Result returned by run: pandas DataFrame, one row per dataset:
+    groupId, datasetId, requestId, status, triggered_at, finished_at, duration_seconds, polls, error
+  """
+
+  result_columns = ['groupId', 'datasetId', 'requestId', 'status', 'triggered_at', 'finished_at', 'duration_seconds', 'polls', 'error']
+
+  def __init__(self, client, max_concurrency=5, poll_interval=10, poll_backoff=1.5, max_poll_interval=120, timeout=4 * 3600,
+               request_id_polls=3):
+    self.client = client
+    self.max_concurrency = max_concurrency
+    self.poll_interval = poll_interval
+    self.poll_backoff = poll_backoff
+    self.max_poll_interval = max_poll_interval
+    self.timeout = timeout
+    self.request_id_polls = request_id_polls
+
+  def __repr__(self):
+    return 'Power BI datasets refresh orchestrator.'
+
+  @staticmethod
+  def _request_id(response):
+    """
+    Id of the triggered refresh, from the RequestId header or the tail of the Location header
+    """
+    request_id = response.headers.get('RequestId')
+    if not request_id and response.headers.get('Location'):
+      request_id = response.headers['Location'].rstrip('/').rsplit('/', 1)[-1]
+    return request_id
+
+  def _refresh_status(self, groupId, datasetId, request_id, started_after=None):
+    """
+    History entry of the triggered refresh. The latest entry if its id is unknown, or the latest entry started
+    at or after started_after if the id is not in the history and started_after is given.
+    """
+    history = self.client.refresh_history(groupId, datasetId)
+    history.sync()
+    entry = history.get(request_id) if request_id is not None else history.latest(started_after)
+    if entry is None and started_after is not None:
+      entry = history.latest(started_after)
+    return entry or {'status': 'Unknown'}
+
+  def refresh_dataset(self, dataset):
+    """
+    Triggers the refresh of one dataset and polls its status until it finishes or times out.
+    """
+    groupId, datasetId = dataset['groupId'], dataset['datasetId']
+    result = dict.fromkeys(self.result_columns)
+    result.update({'groupId': groupId, 'datasetId': datasetId, 'polls': 0})
+    started = time.monotonic()
+    result['triggered_at'] = datetime.now(timezone.utc)
+
+    try:
+      response = self.client.refresh_pbi(
+        groupId, datasetId, tables=dataset.get('tables'),
+        refresh_mode=dataset.get('refresh_mode', 'enhanced'), body=dataset.get('body'),
+      )
+      if response.status_code not in (200, 202):
+        result.update({'status': 'TriggerFailed', 'error': response.text})
+      else:
+        result['requestId'] = self._request_id(response)
+        interval = self.poll_interval
+        while True:
+          if time.monotonic() - started > self.timeout:
+            result['status'] = 'TimedOut'
+            break
+          time.sleep(interval)
+          started_after = result['triggered_at'] if result['polls'] >= self.request_id_polls else None
+          entry = self._refresh_status(groupId, datasetId, result['requestId'], started_after)
+          result['polls'] += 1
+          if entry.get('requestId'):
+            result['requestId'] = entry['requestId']
+          if entry.get('status') not in PowerBIRefreshHistory.running_statuses:
+            result['status'] = entry.get('status')
+            result['error'] = entry.get('serviceExceptionJson')
+            break
+          interval = min(interval * self.poll_backoff, self.max_poll_interval)
+    except Exception as e:
+      result.update({'status': 'Error', 'error': f'{type(e).__name__}: {e}'})
+
+    result['finished_at'] = datetime.now(timezone.utc)
+    result['duration_seconds'] = round(time.monotonic() - started, 3)
+    return result
+
+  def run(self, datasets):
+
+    with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+      results = list(pool.map(self.refresh_dataset, datasets))
+
+    for r in results:
+      print(f"{r['groupId']}/{r['datasetId']}: {r['status']} in {r['duration_seconds']}s")
+    return pd.DataFrame(results, columns=self.result_columns)
@@ -0,0 +1,387 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC Unit tests of `PowerBIRefreshOrchestrator` against a local `http.server` stand-in of the Power BI refresh API:
+# MAGIC - 429 with `Retry-After` on the refresh trigger
+# MAGIC - refresh id taken from the `RequestId` or the `Location` header, newest refresh after the trigger when the id is not in the history
+# MAGIC - adaptive polling until a terminal status
+# MAGIC - timeout of a refresh that never finishes
+# MAGIC
+# MAGIC and of `PowerBIClient` itself: retries of GET / POST, token refresh on 401 and the token cache shared by clients,
+# MAGIC incremental refresh history sync and concurrent cancellation
+
+# COMMAND ----------
+
+# MAGIC %run ./powerbi_client
+
+# COMMAND ----------
+
+import json
+import re
+import threading
+import time
+import unittest
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# COMMAND ----------
+
+class PowerBIStubServer:
+  """
+  Local stand-in of the refresh endpoints: POST .../refreshes triggers a refresh, GET .../refreshes?$top=n lists them,
+  DELETE .../refreshes/{requestId} cancels one. Refreshes can also be added to `refreshes` directly with `refresh()`.
+
+  Per dataset settings:
+    throttle - number of POSTs answered with 429 and Retry-After before the trigger is accepted
+    location_only - the trigger answers with the Location header only, without RequestId
+    unmatched_request_id - the RequestId header of the trigger does not match the requestId in the history
+    concurrent_refresh - another refresh of the dataset is started right after the triggered one and fails
+    duration - seconds until the refresh reaches its final status
+    final_status - final status, Completed by default
+    unauthorized - number of GETs answered with 401
+    server_errors - number of requests of every method answered with 500
+    cancel_errors - requestIds whose DELETE is answered with 400
+  """
+
+  def __init__(self):
+    self.datasets = {}
+    self.refreshes = {}
+    self.calls = []
+    self.authorizations = []
+    self.lock = threading.Lock()
+    server = self
+
+    class Handler(BaseHTTPRequestHandler):
+      protocol_version = 'HTTP/1.1'
+
+      def log_message(self, *args):
+        pass
+
+      def send(self, code, body=None, headers=None):
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+          self.send_header(key, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+      def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        groupId, datasetId = re.match(r'/groups/([^/]+)/datasets/([^/]+)/refreshes', self.path).groups()
+        settings = server.datasets.get(datasetId, {})
+        with server.lock:
+          server.calls.append(('POST', datasetId, time.monotonic()))
+          server.authorizations.append(self.headers.get('Authorization'))
+          failure = server.failure('POST', datasetId, settings)
+          if failure:
+            return self.send(failure, {'error': {'code': 'Failure'}})
+          throttled = sum(1 for call in server.calls if call[:2] == ('POST', datasetId)) <= settings.get('throttle', 0)
+          if not throttled:
+            requestId = str(uuid.uuid4())
+            server.refreshes.setdefault(datasetId, []).insert(0, server.refresh(requestId))
+            if settings.get('concurrent_refresh'):
+              server.refreshes[datasetId].insert(0, server.refresh(f'other-{uuid.uuid4()}', status='Failed'))
+        if throttled:
+          return self.send(429, {'error': {'code': 'TooManyRequests'}}, {'Retry-After': str(settings.get('retry_after', 1))})
+        location = f'{server.url}/groups/{groupId}/datasets/{datasetId}/refreshes/{requestId}'
+        headers = {'Location': location} if settings.get('location_only') else {'RequestId': requestId, 'Location': location}
+        if settings.get('unmatched_request_id'):
+          headers = {'RequestId': str(uuid.uuid4())}
+        self.send(202, None, headers)
+
+      def do_GET(self):
+        datasetId = re.match(r'/groups/[^/]+/datasets/([^/]+)/refreshes', self.path).group(1)
+        settings = server.datasets.get(datasetId, {})
+        top = int(re.search(r'top=(\d+)', self.path).group(1))
+        with server.lock:
+          server.calls.append(('GET', datasetId, time.monotonic(), top))
+          server.authorizations.append(self.headers.get('Authorization'))
+          failure = server.failure('GET', datasetId, settings)
+          if failure:
+            return self.send(failure, {'error': {'code': 'Failure'}})
+          entries = []
+          for refresh in server.refreshes.get(datasetId, []):
+            finished = time.monotonic() - refresh['started'] >= refresh.get('duration', settings.get('duration', 0))
+            final_status = refresh.get('status', settings.get('final_status', 'Completed'))
+            entry = {'requestId': refresh['requestId'], 'startTime': refresh['startTime'], 'status': final_status if finished else 'Unknown'}
+            if finished and entry['status'] == 'Failed':
+              entry['serviceExceptionJson'] = '{"errorCode":"ModelRefreshFailed"}'
+            entries.append(entry)
+        self.send(200, {'value': entries[:top]})
+
+      def do_DELETE(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        datasetId, requestId = re.match(r'/groups/[^/]+/datasets/([^/]+)/refreshes/([^/?]+)', self.path).groups()
+        settings = server.datasets.get(datasetId, {})
+        with server.lock:
+          server.calls.append(('DELETE', datasetId, time.monotonic(), requestId))
+          if requestId in settings.get('cancel_errors', ()):
+            return self.send(400, {'error': {'code': 'InvalidRequest'}})
+          for refresh in server.refreshes.get(datasetId, []):
+            if refresh['requestId'] == requestId:
+              refresh.update({'status': 'Cancelled', 'duration': 0})
+        self.send(200)
+
+    self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    self.httpd.daemon_threads = True
+    self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+    threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+  @staticmethod
+  def refresh(requestId, **kwargs):
+    startTime = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    return {'requestId': requestId, 'started': time.monotonic(), 'startTime': startTime, **kwargs}
+
+  def failure(self, method, datasetId, settings):
+    """
+    Error status of the current request: 401 for the first unauthorized GETs, 500 for the first server_errors requests
+    """
+    number = sum(1 for call in self.calls if call[:2] == (method, datasetId))
+    if method == 'GET' and number <= settings.get('unauthorized', 0):
+      return 401
+    if number <= settings.get('server_errors', 0):
+      return 500
+    return None
+
+  def times(self, method, datasetId):
+    return [call[2] for call in self.calls if call[:2] == (method, datasetId)]
+
+  def arguments(self, method, datasetId):
+    """
+    $top of the GETs, requestId of the DELETEs
+    """
+    return [call[3] for call in self.calls if call[:2] == (method, datasetId)]
+
+  def close(self):
+    self.httpd.shutdown()
+    self.httpd.server_close()
+
+# COMMAND ----------
+
+class StubCredential:
+
+  class Token:
+    def __init__(self, number):
+      self.token = f'test-token-{number}'
+      self.expires_on = time.time() + 3600
+
+  def __init__(self):
+    self.calls = 0
+
+  def get_token(self, scope):
+    self.calls += 1
+    return self.Token(self.calls)
+
+# COMMAND ----------
+
+class TestPowerBIRefreshOrchestrator(unittest.TestCase):
+
+  group_id = 'testGroup'
+
+  #Runs at the start of each test
+  def setUp(self):
+    self.server = PowerBIStubServer()
+    self.client = PowerBIClient(credential=StubCredential(), backoff_factor=0.1, timeout=(5, 5))
+    self.client.api_url = self.server.url
+
+  def tearDown(self):
+    self.client.close()
+    self.server.close()
+
+  def orchestrator(self, **kwargs):
+    return PowerBIRefreshOrchestrator(self.client, **{'poll_interval': 0.1, 'poll_backoff': 2, 'max_poll_interval': 0.4, **kwargs})
+
+  def dataset(self, datasetId, **settings):
+    self.server.datasets[datasetId] = settings
+    return {'groupId': self.group_id, 'datasetId': datasetId}
+
+  #Scenario 1: Refresh trigger answered with 429 is sent again after Retry-After and the refresh completes
+  def test_throttled_trigger(self):
+    result = self.orchestrator().run([self.dataset('throttled', throttle=1, retry_after=1)]).iloc[0]
+
+    posts = self.server.times('POST', 'throttled')
+    self.assertEqual(len(posts), 2)
+    self.assertGreaterEqual(posts[1] - posts[0], 1)
+    self.assertEqual(result['status'], 'Completed')
+
+  #Scenario 2: Refresh id comes from the RequestId header, or from the Location header when RequestId is missing,
+  #and the status of that refresh is reported, not of the newest one in the history
+  def test_request_id_headers(self):
+    datasets = [
+      self.dataset('byRequestId', duration=0.3, concurrent_refresh=True),
+      self.dataset('byLocation', duration=0.3, concurrent_refresh=True, location_only=True),
+    ]
+    results = self.orchestrator().run(datasets).set_index('datasetId')
+
+    for datasetId in ('byRequestId', 'byLocation'):
+      triggered = [r['requestId'] for r in self.server.refreshes[datasetId] if not r['requestId'].startswith('other-')]
+      self.assertEqual(results.loc[datasetId, 'requestId'], triggered[0])
+      self.assertEqual(results.loc[datasetId, 'status'], 'Completed')
+
+  #Scenario 3: RequestId header that never shows up in the history falls back to the newest refresh started after the trigger
+  def test_unmatched_request_id(self):
+    result = self.orchestrator(request_id_polls=2, timeout=5).run([self.dataset('unmatched', duration=0.3, unmatched_request_id=True)]).iloc[0]
+
+    self.assertEqual(result['status'], 'Completed')
+    self.assertEqual(result['requestId'], self.server.refreshes['unmatched'][0]['requestId'])
+    self.assertLess(result['duration_seconds'], 3)
+
+  #Scenario 4: Polling interval grows by poll_backoff up to max_poll_interval until the final status, errors are reported
+  def test_adaptive_polling(self):
+    results = self.orchestrator().run([
+      self.dataset('slow', duration=1.2), self.dataset('failed', duration=0.2, final_status='Failed'),
+    ]).set_index('datasetId')
+
+    gets = self.server.times('GET', 'slow')
+    gaps = [b - a for a, b in zip(gets, gets[1:])]
+    self.assertEqual(results.loc['slow', 'status'], 'Completed')
+    self.assertEqual(results.loc['slow', 'polls'], len(gets))
+    self.assertLessEqual(len(gets), 6)
+    self.assertGreater(gaps[1], gaps[0] * 1.5)
+    self.assertTrue(all(gap < 0.6 for gap in gaps))
+    self.assertEqual(results.loc['failed', 'status'], 'Failed')
+    self.assertIn('ModelRefreshFailed', results.loc['failed', 'error'])
+
+  #Scenario 5: Refresh that does not finish within timeout is reported as TimedOut
+  def test_timeout(self):
+    result = self.orchestrator(timeout=0.5).run([self.dataset('stuck', duration=3600)]).iloc[0]
+
+    self.assertEqual(result['status'], 'TimedOut')
+    self.assertLess(result['duration_seconds'], 2)
+    self.assertGreater(result['polls'], 0)
+
+# COMMAND ----------
+
+class TestPowerBIClient(unittest.TestCase):
+
+  group_id = 'testGroup'
+
+  #Runs at the start of each test
+  def setUp(self):
+    PowerBIClient._tokens.clear()
+    self.server = PowerBIStubServer()
+    self.credential = StubCredential()
+    self.client = self.new_client(self.credential)
+
+  def tearDown(self):
+    self.client.close()
+    self.server.close()
+
+  def new_client(self, credential):
+    client = PowerBIClient(tenant_id='testTenant', client_id='testClient', credential=credential, backoff_factor=0.1, timeout=(5, 5))
+    client.api_url = self.server.url
+    return client
+
+  def history_url(self, datasetId, **settings):
+    self.server.datasets[datasetId] = settings
+    return f'{self.client.refreshes_uri(self.group_id, datasetId)}?$top=1'
+
+  #Scenario 1: 401 drops the cached token, the request is sent again once with a new token
+  def test_unauthorized(self):
+    response = self.client.get(self.history_url('unauthorized', unauthorized=1))
+
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(self.credential.calls, 2)
+    self.assertEqual(self.server.authorizations, ['Bearer test-token-1', 'Bearer test-token-2'])
+
+  #Scenario 2: 500 is retried for GET, but not for POST, which the service may have processed
+  def test_server_errors(self):
+    response = self.client.get(self.history_url('getError', server_errors=1))
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(len(self.server.times('GET', 'getError')), 2)
+
+    self.server.datasets['postError'] = {'server_errors': 1}
+    response = self.client.refresh_pbi(self.group_id, 'postError')
+    self.assertEqual(response.status_code, 500)
+    self.assertEqual(len(self.server.times('POST', 'postError')), 1)
+
+  #Scenario 3: 429 is retried for POST after Retry-After
+  def test_throttled_post(self):
+    self.server.datasets['throttled'] = {'throttle': 2, 'retry_after': 1}
+    response = self.client.refresh_pbi(self.group_id, 'throttled')
+
+    posts = self.server.times('POST', 'throttled')
+    self.assertEqual(response.status_code, 202)
+    self.assertEqual(len(posts), 3)
+    self.assertGreaterEqual(posts[2] - posts[1], 1)
+
+  #Scenario 4: Token is requested once for all clients of the same service principal
+  def test_token_cache(self):
+    other_credential = StubCredential()
+    other_client = self.new_client(other_credential)
+    try:
+      self.assertEqual(self.client.get(self.history_url('cached')).status_code, 200)
+      self.assertEqual(other_client.get(self.history_url('cached')).status_code, 200)
+    finally:
+      other_client.close()
+
+    self.assertEqual(self.credential.calls, 1)
+    self.assertEqual(other_credential.calls, 0)
+    self.assertEqual(set(self.server.authorizations), {'Bearer test-token-1'})
+
+# COMMAND ----------
+
+class TestPowerBIRefreshHistory(unittest.TestCase):
+
+  group_id = 'testGroup'
+
+  #Runs at the start of each test
+  def setUp(self):
+    self.server = PowerBIStubServer()
+    self.client = PowerBIClient(credential=StubCredential(), backoff_factor=0.1, timeout=(5, 5))
+    self.client.api_url = self.server.url
+
+  def tearDown(self):
+    self.client.close()
+    self.server.close()
+
+  def add_refreshes(self, datasetId, requestIds, **kwargs):
+    self.server.refreshes[datasetId] = [self.server.refresh(rid, **kwargs) for rid in requestIds] + self.server.refreshes.get(datasetId, [])
+
+  #Scenario 1: Sync asks for one page while it reaches a known finished refresh, and doubles $top until it does
+  def test_incremental_sync(self):
+    self.add_refreshes('history', [f'old-{i}' for i in range(25)])
+    history = self.client.refresh_history(self.group_id, 'history')
+    self.assertEqual(len(history.sync()), 10)
+
+    self.add_refreshes('history', [f'new-{i}' for i in range(3)])
+    changed = history.sync()
+    self.assertEqual([entry['requestId'] for entry in changed], ['new-0', 'new-1', 'new-2'])
+    self.assertEqual(self.server.arguments('GET', 'history'), [10, 10])
+
+    self.add_refreshes('history', [f'newer-{i}' for i in range(15)])
+    changed = history.sync()
+    self.assertEqual(len(changed), 15)
+    self.assertEqual(self.server.arguments('GET', 'history'), [10, 10, 10, 20])
+    self.assertEqual(history.latest()['requestId'], 'newer-0')
+
+  #Scenario 2: Every refresh in progress is cancelled, a failed DELETE is reported in its own row
+  def test_cancel(self):
+    self.server.datasets['cancel'] = {'cancel_errors': {'running-1'}}
+    self.add_refreshes('cancel', ['done-0'])
+    self.add_refreshes('cancel', ['running-0', 'running-1', 'running-2'], duration=3600)
+
+    results = {r['requestId']: r for r in self.client.cancel_pbi_refresh(self.group_id, 'cancel')}
+
+    self.assertEqual(sorted(results), ['running-0', 'running-1', 'running-2'])
+    self.assertEqual(sorted(self.server.arguments('DELETE', 'cancel')), ['running-0', 'running-1', 'running-2'])
+    self.assertFalse(results['running-1']['ok'])
+    self.assertEqual(results['running-1']['status_code'], 400)
+    self.assertTrue(results['running-0']['ok'] and results['running-2']['ok'])
+
+# COMMAND ----------
+
+if __name__ == "__main__":
+
+  suite = unittest.TestSuite()
+  for test_case in (TestPowerBIRefreshOrchestrator, TestPowerBIClient, TestPowerBIRefreshHistory):
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(test_case))
+  result = unittest.TextTestRunner(verbosity=2).run(suite)
+
+  if not result.wasSuccessful():
+    dbutils.notebook.exit(0)
+    raise Exception("One or more tests failed!")
+
+  print("All tests passed!")
+  dbutils.notebook.exit(1)